@@ -0,0 +1,243 @@
+# admission.py
+
+import functools
+import inspect
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import request_context
+from metrics import Histogram, registry
+
+BUSY_MESSAGE = "⏳ The instructor is busy right now. Please try again in a moment."
+
+# Lower runs first. Chat and progress updates are interactive; whole-topic generation is bulk work.
+ACTION_PRIORITIES = {
+    "chat": 0,
+    "mark_completed": 0,
+    "translate": 1,
+    "assignment": 1,
+    "quiz": 1,
+    "flashcards": 1,
+    "generate_material": 2,
+}
+
+# Concurrent handlers per action (~13 LLM calls per "Generate Study Material" click, one per chat turn)
+ACTION_LIMITS = {
+    "generate_material": 4,
+    "assignment": 4,
+    "quiz": 4,
+    "flashcards": 4,
+    "translate": 8,
+}
+
+
+class Rejected(Exception):
+    """The action was not admitted: its queue is full or the wait ran out. The caller should try later."""
+
+
+class _Waiter:
+    __slots__ = ("action", "priority", "seq", "admitted")
+
+    def __init__(self, action: str, priority: int, seq: int):
+        self.action = action
+        self.priority = priority
+        self.seq = seq
+        self.admitted = False
+
+
+class AdmissionController:
+    """
+    Admission control for handlers: at most `capacity` run at once and each action at most its
+    limit. Waiting calls are admitted by priority (then arrival); actions with a priority above
+    0 never take the last `reserve` slots, so a burst of bulk generation leaves room for chat.
+    A call is rejected at once when its action already has `max_queue` waiting, or after
+    waiting `max_wait` seconds.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 16,
+        limits: Optional[Dict[str, int]] = None,
+        priorities: Optional[Dict[str, int]] = None,
+        max_queue: int = 32,
+        max_wait: Optional[float] = 30.0,
+        reserve: int = 2,
+    ):
+        self.capacity = capacity
+        self.limits = dict(ACTION_LIMITS if limits is None else limits)
+        self.priorities = dict(ACTION_PRIORITIES if priorities is None else priorities)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.reserve = reserve
+        self.running: Dict[str, int] = {}
+        self.admitted: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.waits: Dict[str, Histogram] = {}
+        self._waiting: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _dispatch(self):
+        """Admit waiters in priority order while slots are free. Called with the lock held."""
+        total = sum(self.running.values())
+        for waiter in sorted(self._waiting, key=lambda w: (w.priority, w.seq)):
+            free = self.capacity - total
+            if free <= 0:
+                break
+            if waiter.priority > 0 and free <= self.reserve:
+                continue
+            if self.running.get(waiter.action, 0) >= self.limits.get(waiter.action, self.capacity):
+                continue
+            waiter.admitted = True
+            self._waiting.remove(waiter)
+            self.running[waiter.action] = self.running.get(waiter.action, 0) + 1
+            total += 1
+        self._cond.notify_all()
+
+    def acquire(self, action: str, timeout: Optional[float] = None):
+        """
+        Block until `action` may run.
+
+        :param timeout: Longest wait in seconds (default max_wait)
+        :raise Rejected: The queue for the action is full, or no slot freed up in time
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        start = time.monotonic()
+        with self._cond:
+            if sum(w.action == action for w in self._waiting) >= self.max_queue:
+                self.rejected[action] = self.rejected.get(action, 0) + 1
+                raise Rejected(f"too many '{action}' requests waiting")
+            waiter = _Waiter(action, self.priorities.get(action, 1), next(self._seq))
+            self._waiting.append(waiter)
+            self._dispatch()
+            try:
+                while not waiter.admitted:
+                    remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                    if remaining is not None and remaining <= 0:
+                        self.rejected[action] = self.rejected.get(action, 0) + 1
+                        raise Rejected(f"'{action}' waited {timeout:g}s without a free slot")
+                    try:
+                        request_context.check()
+                    except request_context.DeadlineExceeded:
+                        self.rejected[action] = self.rejected.get(action, 0) + 1
+                        raise Rejected(f"'{action}' ran out of its time budget while waiting")
+                    self._cond.wait(0.25 if remaining is None else min(remaining, 0.25))
+            except BaseException:
+                if waiter.admitted:  # admitted just as we gave up: hand the slot back
+                    self._release(action)
+                else:
+                    self._waiting.remove(waiter)
+                raise
+            wait = time.monotonic() - start
+            self.admitted[action] = self.admitted.get(action, 0) + 1
+            self.waits.setdefault(action, Histogram()).observe(wait)
+        registry.observe("admission_wait_seconds", wait, action=action)
+
+    def _release(self, action: str):
+        self.running[action] -= 1
+        self._dispatch()
+
+    def release(self, action: str):
+        with self._cond:
+            self._release(action)
+
+    def guard(self, action: str, busy: Optional[Callable] = None):
+        """
+        Decorator for Gradio handlers: the handler runs only once admitted and holds its slot
+        until it returns (generator handlers: until exhausted or closed). When rejected, the
+        handler returns (or yields) busy(*args, **kwargs) instead; without `busy`, Rejected is raised.
+        Applied inside request_context.bounded, the wait counts against the action's time budget
+        and a cancelled request leaves the queue (a generator handler then just ends).
+        """
+        def decorate(fn):
+            if inspect.isgeneratorfunction(fn):
+                @functools.wraps(fn)
+                def generator_wrapper(*args, **kwargs):
+                    try:
+                        self.acquire(action)
+                    except request_context.Cancelled:
+                        return
+                    except Rejected:
+                        if busy is None:
+                            raise
+                        yield busy(*args, **kwargs)
+                        return
+                    try:
+                        yield from fn(*args, **kwargs)
+                    finally:
+                        self.release(action)
+                return generator_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                try:
+                    self.acquire(action)
+                except Rejected:
+                    if busy is None:
+                        raise
+                    return busy(*args, **kwargs)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.release(action)
+            return wrapper
+        return decorate
+
+    def stats(self) -> Dict[str, dict]:
+        """Per action: running, waiting, admitted, rejected and wait p50/p95 (seconds)."""
+        with self._cond:
+            actions = set(self.running) | set(self.rejected) | {w.action for w in self._waiting}
+            return {
+                action: {
+                    "running": self.running.get(action, 0),
+                    "waiting": sum(w.action == action for w in self._waiting),
+                    "admitted": self.admitted.get(action, 0),
+                    "rejected": self.rejected.get(action, 0),
+                    "wait_p50": self.waits[action].percentile(50) if action in self.waits else 0.0,
+                    "wait_p95": self.waits[action].percentile(95) if action in self.waits else 0.0,
+                }
+                for action in sorted(actions)
+            }
+
+    def stats_table(self) -> str:
+        """Human-readable queue table (used by the Metrics tab)."""
+        rows = [f"{'action':<20}{'running':>9}{'waiting':>9}{'admitted':>10}{'rejected':>10}{'wait p50':>10}{'wait p95':>10}"]
+        for action, s in self.stats().items():
+            rows.append(
+                f"{action:<20}{s['running']:>9}{s['waiting']:>9}{s['admitted']:>10}{s['rejected']:>10}"
+                f"{s['wait_p50']:>10.2f}{s['wait_p95']:>10.2f}"
+            )
+        return "\n".join(rows)
+
+    def metrics(self):
+        """Collector for metrics.registry."""
+        gauges = []
+        for action, s in self.stats().items():
+            gauges.append(("admission_running", s["running"], {"action": action}))
+            gauges.append(("admission_queue_depth", s["waiting"], {"action": action}))
+            gauges.append(("admission_rejected_total", s["rejected"], {"action": action}))
+        return gauges
+
+
+def default_controller() -> AdmissionController:
+    """
+    Controller configured from ADMISSION_CAPACITY, ADMISSION_LIMITS ("generate_material=4,chat=12"
+    overrides), ADMISSION_QUEUE, ADMISSION_MAX_WAIT (seconds) and ADMISSION_RESERVE.
+    """
+    limits = dict(ACTION_LIMITS)
+    for pair in os.getenv("ADMISSION_LIMITS", "").split(","):
+        if "=" in pair:
+            action, limit = pair.split("=", 1)
+            limits[action.strip()] = int(limit)
+    controller = AdmissionController(
+        capacity=int(os.getenv("ADMISSION_CAPACITY", 16)),
+        limits=limits,
+        max_queue=int(os.getenv("ADMISSION_QUEUE", 32)),
+        max_wait=float(os.getenv("ADMISSION_MAX_WAIT", 30)) or None,
+        reserve=int(os.getenv("ADMISSION_RESERVE", 2)),
+    )
+    registry.register_collector(controller.metrics)
+    return controller
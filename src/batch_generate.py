@@ -0,0 +1,211 @@
+# batch_generate.py
+"""
+Headless batch generation of study material for a whole course catalog.
+
+    python batch_generate.py topics.csv -o material.jsonl --workers 4
+    python batch_generate.py topics.jsonl -o material.jsonl --generators syllabus,quiz --syllabus-mode fast
+
+Input is a CSV with a "topic" column (or topics in the first column), a JSONL file of
+{"topic": ...} objects, or plain text with one topic per line. Results are appended to the
+output JSONL as each topic finishes, so an interrupted run resumes where it stopped:
+topics already written without errors are skipped, and a topic whose latest line has errors
+only regenerates the steps that failed (the new line replaces the old one).
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from study_models import normalize_topic
+
+GENERATORS = ("syllabus", "assignment", "quiz", "flashcards")
+
+
+def read_topics(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["topic"] if isinstance(record, dict) else str(record)
+        elif path.endswith(".csv"):
+            rows = list(csv.reader(f))
+            if not rows:
+                return
+            header = [cell.strip().lower() for cell in rows[0]]
+            column = header.index("topic") if "topic" in header else 0
+            for row in rows[1:] if "topic" in header else rows:
+                if len(row) > column and row[column].strip():
+                    yield row[column]
+        else:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+
+
+def unique_topics(topics) -> List[str]:
+    seen = set()
+    result = []
+    for topic in topics:
+        key = normalize_topic(topic)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(topic.strip())
+    return result
+
+
+def latest_records(output_path: str) -> Dict[str, Dict]:
+    """The last record written for each topic key (a half-written last line from a crash is ignored)."""
+    records = {}
+    if not os.path.exists(output_path):
+        return records
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["key"]] = record
+    return records
+
+
+def completed_keys(output_path: str) -> set:
+    """Topics whose latest record has no errors."""
+    return {key for key, record in latest_records(output_path).items() if not record.get("errors")}
+
+
+def _checked(value: str) -> str:
+    # The generators report some failures as a "⚠️ ..." message instead of raising.
+    if isinstance(value, str) and value.startswith("⚠️"):
+        raise RuntimeError(value)
+    return value
+
+
+def generate_topic(topic: str, generators, syllabus_mode: str, previous: Dict = None) -> Dict:
+    """
+    :param previous: The topic's last record from an earlier run; steps that succeeded there are
+        kept and only the failed ones are generated again
+    """
+    from generating_syllabus import generate_assignment, generate_quiz, generate_syllabus
+    from flashcard_generator import generate_flashcards
+    from study_models import parse_flashcards, parse_quiz
+
+    record = {"topic": topic, "key": normalize_topic(topic), "errors": {}}
+    start = time.perf_counter()
+    steps = {
+        "syllabus": lambda: generate_syllabus(topic, f"Generate a course syllabus to teach the topic: {topic}", mode=syllabus_mode),
+        "assignment": lambda: generate_assignment(topic),
+        "quiz": lambda: generate_quiz(topic),
+        # Flashcards are drawn from the syllabus when there is one, otherwise from the topic itself.
+        "flashcards": lambda: generate_flashcards(record.get("syllabus") or topic),
+    }
+    previous = previous or {}
+    for name in GENERATORS:
+        if name in generators:
+            if previous.get(name) and name not in previous.get("errors", {}):
+                record[name] = previous[name]
+                continue
+            try:
+                record[name] = _checked(steps[name]())
+            except Exception as e:
+                record["errors"][name] = str(e)
+    # Parsed once here so graders and exporters can load the typed form without re-parsing.
+    if record.get("quiz"):
+        record["quiz_data"] = parse_quiz(record["quiz"], topic=topic).to_compact()
+    if record.get("flashcards"):
+        record["flashcards_data"] = [card.to_compact() for card in parse_flashcards(record["flashcards"])]
+    record["seconds"] = round(time.perf_counter() - start, 2)
+    return record
+
+
+def run_batch(topics: List[str], output_path: str, generators=GENERATORS, workers: int = 4, syllabus_mode: str = None) -> Dict:
+    """
+    Generate material for every topic with at most `workers` topics in flight.
+    :return: Run summary (counts, throughput, tokens spent)
+    """
+    from tokens import usage_snapshot
+
+    previous = latest_records(output_path)
+    done = {key for key, record in previous.items() if not record.get("errors")}
+    pending = [t for t in unique_topics(topics) if normalize_topic(t) not in done]
+    usage_before = usage_snapshot()
+    write_lock = threading.Lock()
+    failed = 0
+    start = time.perf_counter()
+
+    try:
+        from tqdm import tqdm
+        progress = tqdm(total=len(pending), unit="topic")
+    except ImportError:
+        progress = None
+
+    with open(output_path, "a", encoding="utf-8") as out, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(generate_topic, topic, generators, syllabus_mode, previous.get(normalize_topic(topic)))
+            for topic in pending
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            record = future.result()
+            failed += bool(record["errors"])
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            if progress is not None:
+                progress.update(1)
+    if progress is not None:
+        progress.close()
+
+    elapsed = time.perf_counter() - start
+    usage_after = usage_snapshot()
+    return {
+        "topics_in_input": len(topics),
+        "skipped_already_done": len(unique_topics(topics)) - len(pending),
+        "generated": len(pending) - failed,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "topics_per_minute": round(len(pending) / elapsed * 60, 2) if elapsed else 0.0,
+        "llm_calls": usage_after["calls"] - usage_before["calls"],
+        "prompt_tokens": usage_after["prompt_tokens"] - usage_before["prompt_tokens"],
+        "completion_tokens": usage_after["completion_tokens"] - usage_before["completion_tokens"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate study material for a list of topics")
+    parser.add_argument("input", help="CSV, JSONL or text file of topics")
+    parser.add_argument("-o", "--output", default="material.jsonl", help="JSONL results file (also the checkpoint)")
+    parser.add_argument("--workers", type=int, default=4, help="topics generated concurrently")
+    parser.add_argument("--generators", default=",".join(GENERATORS), help="comma-separated subset of " + ",".join(GENERATORS))
+    parser.add_argument("--syllabus-mode", choices=("classic", "fast"), default=None)
+    parser.add_argument("--fake", action="store_true", help="use the offline fake model (no API key needed)")
+    parser.add_argument("--fake-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    generators = [g.strip() for g in args.generators.split(",") if g.strip()]
+    unknown = set(generators) - set(GENERATORS)
+    if unknown:
+        parser.error(f"unknown generators: {', '.join(sorted(unknown))}")
+
+    if args.fake:
+        import llm_registry
+        from fake_llm import FakeChatModel
+
+        fake = FakeChatModel(latency=args.fake_latency)
+        llm_registry.set_factory(lambda model, temperature: fake)
+
+    summary = run_batch(list(read_topics(args.input)), args.output, generators, args.workers, args.syllabus_mode)
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,808 @@
+# benchmark.py
+"""
+Offline benchmarks. Every scenario runs against FakeChatModel, so no API key or network is needed.
+
+    python benchmark.py syllabus [--latency 0.2]
+    python benchmark.py context [--turns 100 --context-turns 6]
+    python benchmark.py retrieval [--topics 24 --turns 20]
+    python benchmark.py progress [--workers 8 --updates 500 --processes]
+    python benchmark.py startup [--repeat 3 --profile run]
+    python benchmark.py http [--requests 40 --fail-every 4 --rate 20]
+    python benchmark.py parse [--cards 100000]
+    python benchmark.py coalesce [--students 30 --latency 0.05]
+    python benchmark.py routing [--calls 200 --latency 0.05 --spike 1.0 --spike-every 25]
+    python benchmark.py admission [--syllabi 40 --chats 60 --capacity 8 --latency 0.05]
+    python benchmark.py prefetch [--turns 40 --continue-ratio 0.7 --latency 0.3 --think 0.5]
+    python benchmark.py grading [--submissions 5000 --batch-size 20 --distinct 300 --latency 0.2]
+    python benchmark.py transcript [--turns 100,1000,10000 --tail 200]
+    python benchmark.py suite [--concurrency 8 --latency 0.05 --replay recording.jsonl --json out.json --baseline old.json]
+"""
+
+import argparse
+import os
+import time
+
+# ✅ Offline defaults: a placeholder key (never sent anywhere) and no response cache
+os.environ.setdefault("OPENROUTER_API_KEY", "offline-benchmark")
+os.environ.setdefault("LLM_CACHE", "off")
+
+import llm_registry
+from fake_llm import FakeChatModel
+
+
+def outline_response(messages):
+    """Fake reply that looks like a finished syllabus for the fast mode, a dialogue turn otherwise."""
+    from generating_syllabus import outline_sys_msg
+
+    if messages[0].content == outline_sys_msg.content:
+        return "\n".join(f"{i}. Section {i}: concept, example, objective." for i in range(1, 13)) + "\n<TASK_DONE>"
+    return "Solution: " + " ".join(["Cover the key concept with a worked example."] * 8) + " Next request."
+
+
+def bench_syllabus(args):
+    import generating_syllabus
+
+    fake = FakeChatModel(responses=outline_response, latency=args.latency)
+    llm_registry.set_factory(lambda model, temperature: fake)
+
+    topic = "Linear Regression"
+    task = f"Generate a course syllabus to teach the topic: {topic}"
+    print(f"{'mode':<18}{'calls':>8}{'prompt tokens':>16}{'latency (s)':>14}{'first content (s)':>20}")
+    for mode in ("classic", "fast"):
+        for streamed in (False, True):
+            fake.reset_counters()
+            start = time.perf_counter()
+            first = None
+            if streamed:
+                for _ in generating_syllabus.generate_syllabus_stream(topic, task, mode=mode):
+                    first = first or time.perf_counter() - start
+            else:
+                generating_syllabus.generate_syllabus(topic, task, mode=mode)
+            elapsed = time.perf_counter() - start
+            label = mode + (" (stream)" if streamed else "")
+            print(f"{label:<18}{fake.calls:>8}{fake.prompt_tokens:>16}{elapsed:>14.2f}{first or elapsed:>20.2f}")
+
+
+def lecture_response(messages):
+    """Fake instructor: a ~150-token lecture segment, or a short summary for summarizer prompts."""
+    if "Update the summary" in messages[-1].content:
+        return " ".join(["Covered the definitions and one worked example."] * 12)
+    return " ".join(["Here is the next concept with a formula and an example."] * 14) + " <END_OF_TURN>"
+
+
+def bench_context(args):
+    from teaching_agent import TeachingGPT
+    from tokens import count_tokens
+
+    syllabus = "\n".join(f"{i}. Topic {i}: definitions, formulas, examples." for i in range(1, 21))
+    checkpoints = sorted({t for t in (1, 10, 25, 50) if t <= args.turns} | {args.turns})
+    print(f"{'mode':<10}" + "".join(f"{'turn ' + str(t):>12}" for t in checkpoints) + f"{'calls':>8}{'total prompt tokens':>22}")
+    for mode, context_turns in (("full", None), ("window", args.context_turns)):
+        fake = FakeChatModel(responses=lecture_response)
+        agent = TeachingGPT.from_llm(fake, context_turns=context_turns)
+        agent.seed_agent(syllabus, "Teach the syllabus")
+        sizes = {}
+        for turn in range(1, args.turns + 1):
+            agent.human_step("continue")
+            prompt = agent.teaching_conversation_utterance_chain.prompt.format(**agent._prompt_inputs())
+            sizes[turn] = count_tokens(prompt)
+            agent.instructor_step()
+        print(f"{mode:<10}" + "".join(f"{sizes[t]:>12}" for t in checkpoints) + f"{fake.calls:>8}{fake.prompt_tokens:>22}")
+
+
+ML_TOPICS = [
+    "Linear Regression", "Logistic Regression", "Gradient Descent", "Regularization", "Decision Trees",
+    "Random Forests", "Gradient Boosting", "Support Vector Machines", "K-Nearest Neighbors", "Naive Bayes",
+    "K-Means Clustering", "Hierarchical Clustering", "Principal Component Analysis", "Neural Networks",
+    "Backpropagation", "Convolutional Networks", "Recurrent Networks", "Transformers", "Attention",
+    "Reinforcement Learning", "Evaluation Metrics", "Cross Validation", "Feature Engineering",
+    "Federated Learning", "Model Deployment", "Fairness", "Explainability", "Anomaly Detection",
+]
+
+
+def make_syllabus(topics: int) -> str:
+    lines = ["Course Syllabus: Machine Learning", ""]
+    for i, name in enumerate(ML_TOPICS[:topics], 1):
+        lines += [
+            f"{i}. {name}",
+            f"   - Definition and intuition of {name.lower()}",
+            f"   - Key formulas and assumptions behind {name.lower()}",
+            f"   - Worked example and common pitfalls of {name.lower()}",
+            f"   - Learning objective: apply {name.lower()} to a real dataset",
+        ]
+    return "\n".join(lines)
+
+
+def section_lecture(messages):
+    """Fake instructor that lectures on the section it was given, moving on when the student says "next"."""
+    prompt = messages[-1].content
+    wants_next = prompt.rstrip().rsplit("===", 1)[0].rstrip().endswith("next <END_OF_TURN>")
+    marker = "Next section:" if wants_next and "Next section:" in prompt else "Current section:"
+    if marker in prompt:
+        section = prompt.split(marker, 1)[1].strip().splitlines()[0]
+        return f"Today we study {section}: definitions, formulas and an example. <END_OF_TURN>"
+    return "Let us continue with the next topic of the syllabus, with definitions and an example. <END_OF_TURN>"
+
+
+def bench_retrieval(args):
+    from teaching_agent import TeachingGPT
+    from tokens import count_tokens
+
+    syllabus = make_syllabus(args.topics)
+    print(f"syllabus: {args.topics} sections, {count_tokens(syllabus)} tokens")
+    print(f"{'mode':<12}{'avg syllabus tokens/turn':>26}{'avg prompt tokens/turn':>24}")
+    for retrieval in (False, True):
+        agent = TeachingGPT.from_llm(FakeChatModel(responses=section_lecture), syllabus_retrieval=retrieval, context_turns=4)
+        agent.seed_agent(syllabus, "Teach the syllabus")
+        syllabus_tokens = prompt_tokens = 0
+        for turn in range(args.turns):
+            agent.human_step("next" if turn % 2 else "continue")
+            inputs = agent._prompt_inputs()
+            syllabus_tokens += count_tokens(inputs["syllabus"])
+            prompt_tokens += count_tokens(agent.teaching_conversation_utterance_chain.prompt.format(**inputs))
+            agent.instructor_step()
+        mode = "retrieval" if retrieval else "full"
+        print(f"{mode:<12}{syllabus_tokens / args.turns:>26.0f}{prompt_tokens / args.turns:>24.0f}   (reached section {agent.section_cursor + 1})")
+
+
+def _progress_worker(backend_name, path, worker, updates):
+    from progress_store import JSONBackend, SQLiteBackend
+
+    backend = SQLiteBackend(path) if backend_name == "sqlite" else JSONBackend(path)
+    for i in range(updates):
+        backend.upsert(f"user-{worker}", f"topic-{i}", "Completed ")
+
+
+def bench_progress(args):
+    """Concurrency stress test: every worker upserts its own topics; any lost update is reported."""
+    import concurrent.futures
+    import tempfile
+    from progress_store import JSONBackend, SQLiteBackend
+
+    executor_cls = concurrent.futures.ProcessPoolExecutor if args.processes else concurrent.futures.ThreadPoolExecutor
+    backends = ["sqlite"] if args.processes else ["json", "sqlite"]  # the JSON file is only safe within one process
+    print(f"{'backend':<10}{'updates':>10}{'seconds':>10}{'updates/s':>12}{'lost':>8}")
+    for name in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "progress.sqlite3" if name == "sqlite" else "progress.json")
+            backend = SQLiteBackend(path) if name == "sqlite" else JSONBackend(path)
+            start = time.perf_counter()
+            with executor_cls(max_workers=args.workers) as pool:
+                list(pool.map(_progress_worker, [name] * args.workers, [path] * args.workers,
+                              range(args.workers), [args.updates] * args.workers))
+            elapsed = time.perf_counter() - start
+            total = args.workers * args.updates
+            if name == "sqlite":
+                stored = sum(len(backend.topics_with_status(f"user-{w}", "Completed ")) for w in range(args.workers))
+                lost = total - stored
+            else:
+                lost = args.updates - len(backend.get_user("default"))  # shared flat mapping
+            print(f"{name:<10}{total:>10}{elapsed:>10.2f}{total / elapsed:>12.0f}{lost:>8}")
+
+
+STARTUP_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+import llm_registry
+print(elapsed, len(llm_registry.clients()))
+"""
+
+
+def bench_startup(args):
+    """Cold-start cost: each module is imported in a fresh interpreter, as a new worker process would."""
+    import re
+    import statistics
+    import subprocess
+    import sys
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    print(f"{'module':<22}{'median import (s)':>20}{'clients built':>16}")
+    for module in ("generating_syllabus", "flashcard_generator", "teaching_agent", "run"):
+        times, clients = [], 0
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, "-c", STARTUP_SNIPPET.format(module=module)],
+                                 cwd=here, env=env, capture_output=True, text=True, check=True)
+            elapsed, clients = out.stdout.split()[-2:]
+            times.append(float(elapsed))
+        print(f"{module:<22}{statistics.median(times):>20.2f}{clients:>16}")
+
+    if args.profile:
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.profile}"],
+                             cwd=here, env=env, capture_output=True, text=True, check=True)
+        rows = []
+        for line in out.stderr.splitlines():
+            match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+            if match and len(match.group(2)) <= 3:  # top-level imports only
+                rows.append((int(match.group(1)), match.group(3)))
+        print(f"\nslowest top-level imports of {args.profile} (cumulative):")
+        for micros, name in sorted(rows, reverse=True)[:10]:
+            print(f"  {micros / 1e6:>8.2f}s  {name}")
+
+
+def bench_http(args):
+    """
+    ChatOpenRouter against a local mock OpenRouter server that answers every `fail_every`-th
+    request with 429 (or 503), to exercise the shared pool, retries and rate limiter.
+    """
+    import concurrent.futures
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class MockOpenRouter(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse shows up as pool hits
+
+        def log_message(self, *_):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                counter["n"] += 1
+                n = counter["n"]
+            if args.fail_every and n % args.fail_every == 0:
+                body = b'{"error": "slow down"}'
+                self.send_response(429 if n % (2 * args.fail_every) else 503)
+                self.send_header("Retry-After", "0.05")
+            else:
+                body = json.dumps({
+                    "id": f"mock-{n}", "object": "chat.completion", "created": 0, "model": "mock",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f"reply {n}"}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+                }).encode()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenRouter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["OPENROUTER_RATE"] = str(args.rate)
+
+    import http_pool
+    from openrouter_llm import ChatOpenRouter
+
+    models = [ChatOpenRouter(temperature=t, response_cache=None) for t in (0.2, 0.7, 1.0)]
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        replies = list(pool.map(lambda i: models[i % 3].invoke(f"question {i}").content, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"{len(replies)} replies in {elapsed:.2f}s from {len(models)} clients sharing one pool")
+    for name, value in http_pool.metrics.snapshot().items():
+        print(f"  {name:<22}{value}")
+
+
+def bench_parse(args):
+    """Parse generated flashcard text once, then compare reloading the compact file with re-parsing."""
+    import tempfile
+    from study_models import Flashcard, load_compact, parse_flashcards, save_compact
+
+    text = "\n".join(
+        f"{i}. **Q:** What is concept number {i} in the course?\n**A:** Concept {i} is explained with an example."
+        for i in range(args.cards)
+    )
+    start = time.perf_counter()
+    cards = parse_flashcards(text)
+    parse_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cards.jsonl.gz")
+        start = time.perf_counter()
+        save_compact(path, cards)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = load_compact(path, Flashcard)
+        load_seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+    assert loaded == cards
+    print(f"parsed {len(cards)} cards from {len(text) / 1e6:.1f} MB of text in {parse_seconds:.2f}s "
+          f"({len(cards) / parse_seconds:,.0f} cards/s)")
+    print(f"compact file: {size / 1e6:.2f} MB, saved in {save_seconds:.2f}s, loaded in {load_seconds:.2f}s "
+          f"({len(loaded) / load_seconds:,.0f} cards/s)")
+
+
+def bench_coalesce(args):
+    """A class of students requesting the same syllabus at once, with and without single-flight."""
+    import concurrent.futures
+    import generating_syllabus
+    from single_flight import SingleFlight
+
+    fake = FakeChatModel(responses=outline_response, latency=args.latency)
+    llm_registry.set_factory(lambda model, temperature: fake)
+    # Students type the topic slightly differently; the normalized key still matches.
+    topics = ["Linear Regression", "linear regression", " Linear  Regression "]
+
+    print(f"{'mode':<14}{'requests':>10}{'llm calls':>11}{'seconds':>9}{'calls saved':>13}")
+    for mode in ("independent", "single-flight"):
+        flight = SingleFlight()
+        generate = generating_syllabus.generate_syllabus
+        if mode == "single-flight":
+            generate = flight.wrap("syllabus", generate)
+        fake.reset_counters()
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.students) as pool:
+            list(pool.map(lambda i: generate(topics[i % 3], f"Generate a course syllabus to teach the topic: {topics[i % 3]}"),
+                          range(args.students)))
+        elapsed = time.perf_counter() - start
+        print(f"{mode:<14}{args.students:>10}{fake.calls:>11}{elapsed:>9.2f}{flight.stats()['calls_saved']:>13}")
+
+
+def bench_routing(args):
+    """One role routed to a model with scripted latency spikes: alone, hedged to a backup, and failing over."""
+    import concurrent.futures
+    import model_router
+
+    def broken(messages):
+        raise ConnectionError("model unavailable")
+
+    script = [args.latency] * (args.spike_every - 1) + [args.spike]
+    fakes = {
+        "primary": FakeChatModel(latency_script=script),
+        "backup": FakeChatModel(latency=args.latency * 1.5),
+        "broken": FakeChatModel(responses=broken),
+    }
+    llm_registry.set_factory(lambda model, temperature: fakes[model])
+    tiers = {"primary only": ["primary"], "hedged": ["primary", "backup"], "failover": ["broken", "backup"]}
+
+    print(f"{'mode':<14}{'calls':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'hedges':>8}{'won':>6}{'wasted':>8}{'fallbacks':>11}")
+    for mode, models in tiers.items():
+        router = model_router.ModelRouter({"standard": models}, min_samples=args.min_samples)
+        model_router.set_router(router)
+        model = model_router.RoutedChatModel(router=router, role="instructor", temperature=0.7)
+        for fake in fakes.values():
+            fake.reset_counters()
+        latencies = []
+
+        def call(i):
+            start = time.perf_counter()
+            model.invoke("Explain the next section.")
+            latencies.append(time.perf_counter() - start)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(call, range(args.calls)))
+        latencies.sort()
+        print(
+            f"{mode:<14}{args.calls:>7}{_percentile(latencies, 50):>8.3f}{_percentile(latencies, 95):>8.3f}"
+            f"{_percentile(latencies, 99):>8.3f}{latencies[-1]:>8.3f}{router.hedges:>8}{router.hedges_won:>6}{router.hedges_wasted:>8}{router.fallbacks:>11}"
+        )
+    model_router.set_router(None)
+
+
+def bench_admission(args):
+    """A burst of syllabus generations while chat turns keep arriving: chat alone, FIFO, and prioritized admission."""
+    import concurrent.futures
+    import generating_syllabus
+    from admission import AdmissionController
+
+    fake = FakeChatModel(responses=outline_response, latency=args.latency)
+    llm_registry.set_factory(lambda model, temperature: fake)
+    controllers = {
+        "chat only": lambda: AdmissionController(capacity=args.capacity),
+        "fifo": lambda: AdmissionController(capacity=args.capacity, limits={}, priorities={}, max_queue=10**6, reserve=0),
+        "admission": lambda: AdmissionController(capacity=args.capacity, max_queue=args.max_queue),
+    }
+
+    print(f"{'mode':<12}{'chat p50':>10}{'chat p95':>10}{'chat max':>10}{'syllabi':>9}{'rejected':>10}{'syllabus p95':>14}{'peak queue':>12}")
+    for mode, make in controllers.items():
+        controller = make()
+        busy = lambda *a: None
+        syllabus = controller.guard("generate_material", busy)(
+            lambda topic: generating_syllabus.generate_syllabus(topic, f"Generate a course syllabus to teach the topic: {topic}")
+        )
+        chat = controller.guard("chat", busy)(lambda i: fake.invoke(f"Question {i}").content)
+        chat_latencies, syllabus_latencies, rejected, peak = [], [], [0], [0]
+
+        def timed(fn, arg, latencies):
+            start = time.perf_counter()
+            if fn(arg) is None:
+                rejected[0] += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.syllabi + args.chats + 1) as pool:
+            futures = []
+            if mode != "chat only":
+                futures += [pool.submit(timed, syllabus, f"Topic {i}", syllabus_latencies) for i in range(args.syllabi)]
+            for i in range(args.chats):
+                futures.append(pool.submit(timed, chat, i, chat_latencies))
+                peak[0] = max(peak[0], sum(s["waiting"] for s in controller.stats().values()))
+                time.sleep(args.chat_interval)
+            concurrent.futures.wait(futures)
+        chat_latencies.sort()
+        syllabus_latencies.sort()
+        print(
+            f"{mode:<12}{_percentile(chat_latencies, 50):>10.3f}{_percentile(chat_latencies, 95):>10.3f}"
+            f"{chat_latencies[-1] if chat_latencies else 0:>10.3f}{len(syllabus_latencies):>9}{rejected[0]:>10}"
+            f"{_percentile(syllabus_latencies, 95):>14.2f}{peak[0]:>12}"
+        )
+
+
+def bench_prefetch(args):
+    """A student who mostly says "continue": reply latency, hit rate and wasted tokens with and without prefetch."""
+    import contextlib
+    import random
+    from metrics import registry
+    from teaching_agent import TeachingGPT
+
+    def counter(name, **labels):
+        return registry.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    print(f"{'mode':<10}{'p50':>8}{'p95':>8}{'calls':>7}{'hit rate':>10}{'wasted prompt':>15}{'wasted completion':>19}{'completion':>12}")
+    for mode in ("off", "prefetch"):
+        fake = FakeChatModel(responses=lecture_response, latency=args.latency, token_latency=args.token_latency)
+        agent = TeachingGPT.from_llm(fake, context_turns=6, prefetch=mode == "prefetch")
+        agent.seed_agent(make_syllabus(12), "Teach the syllabus")
+        rng = random.Random(args.seed)
+        before = {o: counter("instructor_prefetch_total", outcome=o) for o in ("hit", "miss")}
+        wasted = {k: counter("instructor_prefetch_wasted_tokens_total", kind=k) for k in ("prompt", "completion")}
+        latencies = []
+        # The instructor prints every reply; keep the report readable.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            agent.instructor_step()
+            for turn in range(args.turns):
+                time.sleep(args.think)  # the student reads the reply
+                agent.human_step("continue" if rng.random() < args.continue_ratio else f"Can you explain point {turn} again?")
+                start = delivered = time.perf_counter()
+                # Timed to the reply's last token: the summary fold that runs after it is not seen by the student.
+                for _ in agent.instructor_stream():
+                    delivered = time.perf_counter()
+                latencies.append(delivered - start)
+        agent.close()
+        time.sleep(args.latency + 0.1)  # let the last discarded prefetch settle
+        hits = counter("instructor_prefetch_total", outcome="hit") - before["hit"]
+        misses = counter("instructor_prefetch_total", outcome="miss") - before["miss"]
+        latencies.sort()
+        print(
+            f"{mode:<10}{_percentile(latencies, 50):>8.3f}{_percentile(latencies, 95):>8.3f}{fake.calls:>7}"
+            f"{hits / (hits + misses) if hits + misses else 0:>10.0%}"
+            f"{counter('instructor_prefetch_wasted_tokens_total', kind='prompt') - wasted['prompt']:>15.0f}"
+            f"{counter('instructor_prefetch_wasted_tokens_total', kind='completion') - wasted['completion']:>19.0f}"
+            f"{fake.completion_tokens:>12}"
+        )
+
+
+def grading_response(messages):
+    """Fake grader: a rubric, or one "n | score | feedback" line per numbered answer."""
+    import re
+
+    answers = len(re.findall(r"^Answer \d+:", messages[-1].content, re.MULTILINE))
+    if not answers:
+        return "Defines the concept\nGives the formula\nWorks an example"
+    return "\n".join(f"{i} | {(i * 7) % 11} | Covers {(i * 7) % 11 // 3} of the key points." for i in range(1, answers + 1))
+
+
+def bench_grading(args):
+    """Grade a class of submissions: MCQs locally, open answers batched per prompt; submissions graded per second."""
+    import random
+    import tempfile
+    import grading
+    from progress_store import SQLiteBackend
+    from progress_tracker import ProgressTracker
+    from study_models import MCQ, OpenQuestion, Quiz
+
+    quiz = Quiz(
+        "Linear Regression",
+        [MCQ(f"Question {i}?", ("a", "b", "c", "d"), i % 4) for i in range(args.mcqs)],
+        [OpenQuestion(f"Explain idea {i}.") for i in range(2)],
+        [OpenQuestion("Discuss the assumptions of linear regression.")],
+    )
+    rng = random.Random(args.seed)
+    # Students' answers repeat (copied notes, one-word replies); --distinct bounds the variety per question.
+    pool = [f"Answer variant {i}: the model fits a line that minimizes squared error, example {i}." for i in range(args.distinct)]
+    submissions = [
+        grading.Submission(
+            f"student-{i}",
+            [rng.choice("abcd") for _ in range(args.mcqs)],
+            [rng.choice(pool) for _ in range(2)],
+            [rng.choice(pool)],
+        )
+        for i in range(args.submissions)
+    ]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        grading.score_mcqs(quiz, submissions)
+    mcq_rate = args.submissions * args.repeat / (time.perf_counter() - start)
+    print(f"MCQ scoring ({'numpy' if grading.np is not None else 'python'}): {mcq_rate:,.0f} submissions/s")
+
+    print(f"{'batch size':>10}{'llm calls':>11}{'seconds':>9}{'first result':>14}{'submissions/s':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker = ProgressTracker(backend=SQLiteBackend(os.path.join(tmp, "progress.sqlite3")))
+        for batch_size in sorted({1, args.batch_size}):
+            fake = FakeChatModel(responses=grading_response, latency=args.latency)
+            grader = grading.Grader(fake, batch_size=batch_size, max_workers=args.workers)
+            start = time.perf_counter()
+            first = None
+            graded = 0
+            for _ in grader.grade_stream(quiz, submissions, tracker):
+                first = first or time.perf_counter() - start
+                graded += 1
+            elapsed = time.perf_counter() - start
+            print(f"{batch_size:>10}{grader.llm_calls:>11}{elapsed:>9.2f}{first:>14.3f}{graded / elapsed:>15,.0f}")
+        print(f"progress records written: {len(tracker.backend.topic_counts())} topic(s), "
+              f"{tracker.backend.topic_counts().get(grading.QUIZ_TOPIC.format(topic=quiz.topic), 0)} students")
+
+
+def bench_transcript(args):
+    """Append rate, disk size and resume time of the transcript store as a lecture grows."""
+    import tempfile
+    from transcript_store import TranscriptStore
+
+    lecture = " ".join(["Here is the next concept with a formula and an example."] * 14) + " <END_OF_TURN>"
+    print(f"{'turns':>8}{'appends/s':>12}{'raw KB':>9}{'disk KB':>9}{'resume ms':>11}{'full read ms':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TranscriptStore(tmp, max_session_bytes=10**12)  # no compaction: show the cost of a long log
+        for turns in [int(t) for t in args.turns.split(",")]:
+            session = f"session-{turns}"
+            store.seed(session, make_syllabus(12), "Teach the syllabus")
+            raw = 0
+            start = time.perf_counter()
+            for turn in range(1, turns + 1):
+                utterance = f"Question {turn} <END_OF_TURN>" if turn % 2 else f"{turn}. {lecture}"
+                raw += len(utterance)
+                store.turn(session, utterance, turn, pending=2, recent=6)
+            appends = turns / (time.perf_counter() - start)
+            start = time.perf_counter()
+            state = store.load(session, tail=args.tail)
+            resume = time.perf_counter() - start
+            start = time.perf_counter()
+            store.load(session, tail=turns)
+            full = time.perf_counter() - start
+            assert state.turns == turns
+            disk = sum(os.path.getsize(p) for p in store._paths(session))
+            print(f"{turns:>8}{appends:>12,.0f}{raw / 1024:>9.0f}{disk / 1024:>9.0f}{resume * 1000:>11.2f}{full * 1000:>14.2f}")
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] if ordered else 0.0
+
+
+def _run_scenario(name, operation, operations, concurrency):
+    """Run operation(i) for i in range(operations) on `concurrency` threads; time each call and trace memory."""
+    import concurrent.futures
+    import tracemalloc
+
+    latencies = []
+
+    def timed(i):
+        start = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(operations)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies.sort()
+    return {
+        "scenario": name,
+        "ops": operations,
+        "seconds": round(elapsed, 3),
+        "ops_per_s": round(operations / elapsed, 2),
+        "p50": round(_percentile(latencies, 50), 4),
+        "p95": round(_percentile(latencies, 95), 4),
+        "p99": round(_percentile(latencies, 99), 4),
+        "peak_mb": round(peak / 1e6, 2),
+    }
+
+
+SUITE_SCENARIOS = ("syllabus", "quiz", "session", "translation", "progress")
+
+
+def bench_suite(args):
+    """
+    End-to-end offline suite: every scenario runs concurrently against the fake model and the
+    stub translator and reports throughput, latency percentiles and peak traced memory.
+    With --baseline, a scenario whose throughput drops or p95 grows by more than
+    --tolerance is reported as a regression (exit status 1).
+    """
+    import contextlib
+    import json
+    import sys
+    import tempfile
+    from fake_llm import replay, synthetic
+
+    sized = synthetic(args.tokens)
+
+    def responder(messages):
+        return outline_response(messages) if "<TASK_DONE>" in messages[0].content and "syllabus" in messages[0].content.lower() else sized(messages)
+
+    fake = FakeChatModel(
+        responses=replay(args.replay, responder) if args.replay else responder,
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        token_latency=args.token_latency,
+        seed=args.seed,
+    )
+    llm_registry.set_factory(lambda model, temperature: fake)
+
+    from generating_syllabus import generate_quiz, generate_syllabus
+    from multilingual_support import MultilingualSupport
+    from progress_store import SQLiteBackend
+    from progress_tracker import ProgressTracker
+    from teaching_agent import InstructorConversationChain, TeachingGPT
+    from translation_engine import StubBackend, TranslationEngine
+
+    chain = InstructorConversationChain.from_llm(llm_registry.get_chat_model(0.7), verbose=False)
+    syllabus = make_syllabus(12)
+    translator = MultilingualSupport(engine=TranslationEngine(StubBackend(latency=args.translate_latency), max_workers=args.concurrency))
+    lecture = " ".join(["Gradient descent updates the weights against the gradient of the loss."] * 40)
+
+    def session(i):
+        agent = TeachingGPT(teaching_conversation_utterance_chain=chain, context_turns=6)
+        agent.seed_agent(syllabus, "Teach machine learning")
+        for turn in range(args.turns):
+            agent.human_step("continue" if turn else "Let's start")
+            agent.instructor_step()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker = ProgressTracker(backend=SQLiteBackend(os.path.join(tmp, "progress.sqlite3")))
+        operations = {
+            "syllabus": lambda i: generate_syllabus(f"Topic {i}", f"Generate a course syllabus to teach the topic: Topic {i}", mode=args.syllabus_mode),
+            "quiz": lambda i: generate_quiz(f"Topic {i}"),
+            "session": session,
+            "translation": lambda i: translator.translate_languages(f"Lecture {i}. {lecture}", ["ur", "fr", "de", "es"]),
+            "progress": lambda i: tracker.update_progress(f"topic-{i}", user_id=f"user-{i % 50}"),
+        }
+        scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+        results = []
+        # The instructor prints every reply; keep the report readable.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for name in scenarios:
+                fake.reset_counters()
+                result = _run_scenario(name, operations[name], args.iterations, args.concurrency)
+                result["llm_calls"] = fake.calls
+                result["prompt_tokens"] = fake.prompt_tokens
+                results.append(result)
+
+    print(f"{'scenario':<13}{'ops':>6}{'ops/s':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}{'peak MB':>10}{'calls':>8}{'prompt tok':>12}")
+    for r in results:
+        print(f"{r['scenario']:<13}{r['ops']:>6}{r['ops_per_s']:>10.2f}{r['p50']:>10.3f}{r['p95']:>10.3f}{r['p99']:>10.3f}"
+              f"{r['peak_mb']:>10.2f}{r['llm_calls']:>8}{r['prompt_tokens']:>12}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {r["scenario"]: r for r in json.load(f)}
+        regressions = []
+        for r in results:
+            old = baseline.get(r["scenario"])
+            if old is None:
+                continue
+            if r["ops_per_s"] < old["ops_per_s"] * (1 - args.tolerance):
+                regressions.append(f"{r['scenario']}: throughput {old['ops_per_s']} -> {r['ops_per_s']} ops/s")
+            if r["p95"] > old["p95"] * (1 + args.tolerance):
+                regressions.append(f"{r['scenario']}: p95 {old['p95']} -> {r['p95']} s")
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Virtual Instructor benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    syllabus = sub.add_parser("syllabus", help="classic vs fast syllabus generation")
+    syllabus.add_argument("--latency", type=float, default=0.2, help="fake per-call latency in seconds")
+    syllabus.set_defaults(func=bench_syllabus)
+
+    context = sub.add_parser("context", help="instructor prompt size over a long simulated session")
+    context.add_argument("--turns", type=int, default=100)
+    context.add_argument("--context-turns", type=int, default=6, help="verbatim utterances kept in window mode")
+    context.set_defaults(func=bench_context)
+
+    retrieval = sub.add_parser("retrieval", help="instructor prompt size with and without syllabus retrieval")
+    retrieval.add_argument("--topics", type=int, default=24)
+    retrieval.add_argument("--turns", type=int, default=20)
+    retrieval.set_defaults(func=bench_retrieval)
+
+    progress = sub.add_parser("progress", help="concurrent progress updates (lost-update check)")
+    progress.add_argument("--workers", type=int, default=8)
+    progress.add_argument("--updates", type=int, default=500)
+    progress.add_argument("--processes", action="store_true", help="use worker processes instead of threads")
+    progress.set_defaults(func=bench_progress)
+
+    startup = sub.add_parser("startup", help="cold-start import time of the app modules")
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.add_argument("--profile", default=None, help="print the slowest imports of this module (-X importtime)")
+    startup.set_defaults(func=bench_startup)
+
+    http = sub.add_parser("http", help="shared pool, retries and rate limiting against a mock server")
+    http.add_argument("--requests", type=int, default=40)
+    http.add_argument("--fail-every", type=int, default=4, help="every Nth request gets 429/503")
+    http.add_argument("--rate", type=float, default=20, help="token-bucket requests per second")
+    http.set_defaults(func=bench_http)
+
+    parse = sub.add_parser("parse", help="flashcard parsing and compact storage throughput")
+    parse.add_argument("--cards", type=int, default=100000)
+    parse.set_defaults(func=bench_parse)
+
+    coalesce = sub.add_parser("coalesce", help="identical concurrent syllabus requests with and without single-flight")
+    coalesce.add_argument("--students", type=int, default=30)
+    coalesce.add_argument("--latency", type=float, default=0.05)
+    coalesce.set_defaults(func=bench_coalesce)
+
+    routing = sub.add_parser("routing", help="latency-aware model routing with hedged requests and fallback")
+    routing.add_argument("--calls", type=int, default=200)
+    routing.add_argument("--concurrency", type=int, default=4)
+    routing.add_argument("--latency", type=float, default=0.05)
+    routing.add_argument("--spike", type=float, default=1.0, help="latency of the primary's slow calls")
+    routing.add_argument("--spike-every", type=int, default=25, help="every Nth primary call is slow")
+    routing.add_argument("--min-samples", type=int, default=20, help="calls observed before hedging starts")
+    routing.set_defaults(func=bench_routing)
+
+    admission = sub.add_parser("admission", help="syllabus burst vs chat turns under admission control")
+    admission.add_argument("--syllabi", type=int, default=40, help="syllabus requests arriving at once")
+    admission.add_argument("--chats", type=int, default=60, help="chat turns, one every --chat-interval seconds")
+    admission.add_argument("--chat-interval", type=float, default=0.05)
+    admission.add_argument("--capacity", type=int, default=8)
+    admission.add_argument("--max-queue", type=int, default=32)
+    admission.add_argument("--latency", type=float, default=0.05)
+    admission.set_defaults(func=bench_admission)
+
+    prefetch = sub.add_parser("prefetch", help="speculative prefetch of the next instructor turn")
+    prefetch.add_argument("--turns", type=int, default=40)
+    prefetch.add_argument("--continue-ratio", type=float, default=0.7, help="share of student replies that just say continue")
+    prefetch.add_argument("--latency", type=float, default=0.3)
+    prefetch.add_argument("--token-latency", type=float, default=0.0)
+    prefetch.add_argument("--think", type=float, default=0.5, help="seconds the student spends reading each reply")
+    prefetch.add_argument("--seed", type=int, default=0)
+    prefetch.set_defaults(func=bench_prefetch)
+
+    grade = sub.add_parser("grading", help="auto-grade a class of quiz submissions")
+    grade.add_argument("--submissions", type=int, default=5000)
+    grade.add_argument("--mcqs", type=int, default=5)
+    grade.add_argument("--distinct", type=int, default=300, help="distinct answers per open question")
+    grade.add_argument("--batch-size", type=int, default=20)
+    grade.add_argument("--workers", type=int, default=4)
+    grade.add_argument("--latency", type=float, default=0.2)
+    grade.add_argument("--repeat", type=int, default=20, help="MCQ scoring repetitions")
+    grade.add_argument("--seed", type=int, default=0)
+    grade.set_defaults(func=bench_grading)
+
+    transcript = sub.add_parser("transcript", help="transcript store appends, disk size and resume time")
+    transcript.add_argument("--turns", default="100,1000,10000", help="comma-separated lecture lengths")
+    transcript.add_argument("--tail", type=int, default=200, help="utterances restored on resume")
+    transcript.set_defaults(func=bench_transcript)
+
+    suite = sub.add_parser("suite", help="concurrent end-to-end scenarios: throughput, latency percentiles, memory")
+    suite.add_argument("--scenarios", default=",".join(SUITE_SCENARIOS), help="comma-separated subset of " + ",".join(SUITE_SCENARIOS))
+    suite.add_argument("--concurrency", type=int, default=8)
+    suite.add_argument("--iterations", type=int, default=16, help="operations per scenario")
+    suite.add_argument("--turns", type=int, default=5, help="instructor turns per session")
+    suite.add_argument("--latency", type=float, default=0.05, help="fake per-call latency in seconds")
+    suite.add_argument("--jitter", type=float, default=0.0, help="+/- random latency per call (seeded)")
+    suite.add_argument("--token-latency", type=float, default=0.0)
+    suite.add_argument("--tokens", type=int, default=95, help="completion tokens per synthetic reply")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--replay", default=None, help="JSONL recorded with LLM_RECORD_PATH; unrecorded prompts get synthetic replies")
+    suite.add_argument("--translate-latency", type=float, default=0.01, help="stub translator latency per chunk")
+    suite.add_argument("--syllabus-mode", choices=("classic", "fast"), default="classic")
+    suite.add_argument("--json", default=None, help="write results to this file")
+    suite.add_argument("--baseline", default=None, help="results file of an earlier run to compare against")
+    suite.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before a regression is reported")
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
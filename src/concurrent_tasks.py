@@ -0,0 +1,102 @@
+# concurrent_tasks.py
+
+import concurrent.futures
+import contextvars
+import queue
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import request_context
+
+
+class TaskTimeout(Exception):
+    """Raised (as a result value) for a task that did not finish within its time budget."""
+
+
+def stream_concurrently(
+    tasks: Dict[str, Callable[[], Any]],
+    timeouts: Optional[Dict[str, float]] = None,
+    default_timeout: Optional[float] = None,
+    max_workers: Optional[int] = None,
+) -> Iterator[Tuple[str, Any, Optional[BaseException], bool]]:
+    """
+    Run independent callables on a thread pool and report their results as they come. A task
+    may return an iterator whose items are reported as they are produced. Yields
+    (name, value, error, done): (name, item, None, False) for every intermediate item, then one
+    final (name, last item or return value, error, True).
+
+    :param tasks: Mapping of task name -> zero-argument callable
+    :param timeouts: Per-task time budget in seconds (falls back to default_timeout)
+    :param default_timeout: Budget for tasks without an explicit entry (None = no limit)
+    :param max_workers: Thread pool size (defaults to one thread per task)
+
+    Each task runs in a copy of the caller's context (metrics labels, trace spans) under its own
+    RequestContext, a child of the caller's with the task's budget as deadline.
+    A task that exceeds its budget, or every task when the caller closes this iterator, has its
+    RequestContext cancelled: it stops at its next call boundary (or between two items) and
+    its iterator is closed, so a generator issues no further work.
+    """
+    timeouts = timeouts or {}
+    events = queue.Queue()
+    requests = {name: request_context.child(timeouts.get(name, default_timeout)) for name in tasks}
+
+    def work(name, fn):
+        with request_context.scope(requests[name]):
+            _work(name, fn)
+
+    def _work(name, fn):
+        value = None
+        try:
+            result = fn()
+            if isinstance(result, Iterator):
+                try:
+                    for value in result:
+                        # Cancelled or superseded: raise, so the task ends with an error rather than
+                        # reporting its partial value as a finished result.
+                        requests[name].check()
+                        events.put((name, value, None, False))
+                finally:
+                    close = getattr(result, "close", None)
+                    if close is not None:
+                        close()
+            else:
+                value = result
+        except BaseException as e:
+            events.put((name, None, e, True))
+        else:
+            events.put((name, value, None, True))
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or max(len(tasks), 1))
+    start = time.monotonic()
+    deadlines = {}
+    for name, fn in tasks.items():
+        executor.submit(contextvars.copy_context().run, work, name, fn)
+        budget = timeouts.get(name, default_timeout)
+        deadlines[name] = start + budget if budget is not None else None
+
+    pending = set(tasks)
+    try:
+        while pending:
+            active = [deadlines[name] for name in pending if deadlines[name] is not None]
+            wait_for = max(min(active) - time.monotonic(), 0) if active else None
+            try:
+                name, value, error, done = events.get(timeout=wait_for)
+            except queue.Empty:
+                pass
+            else:
+                if name in pending:
+                    if done:
+                        pending.discard(name)
+                    yield name, value, error, done
+
+            now = time.monotonic()
+            for name in list(pending):
+                deadline = deadlines[name]
+                if deadline is not None and now >= deadline:
+                    requests[name].cancel("timed out")
+                    pending.discard(name)
+                    yield name, None, TaskTimeout(f"'{name}' did not finish within {deadline - start:g}s"), True
+    finally:
+        for request in requests.values():
+            request.cancel("closed")
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,268 @@
+# content_store.py
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from study_models import normalize_topic
+
+KINDS = ("syllabus", "assignment", "quiz")
+# Bump when the generator prompts change: entries written by an older version count as stale.
+CONTENT_VERSION = 1
+
+
+class ContentEntry(NamedTuple):
+    value: str
+    created_at: float
+    version: int
+    stale: bool
+
+
+class ContentStore:
+    """
+    Generated study material per topic in SQLite (WAL mode): one row per (topic, kind), plus a per-topic request log used to decide what to pre-generate.
+
+    An entry is stale once it is older than `max_age` seconds or was written by another
+    CONTENT_VERSION; stale entries are still returned (flagged) so callers can serve them
+    while a refresh runs.
+    """
+
+    def __init__(self, db_path: str = "content.sqlite3", max_age: float = 7 * 24 * 3600, version: int = CONTENT_VERSION):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.version = version
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        if self._has_lang_column(conn):
+            self._drop_lang_column(conn)
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS content (
+                topic_key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                value TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (topic_key, kind)
+            );
+            CREATE TABLE IF NOT EXISTS content_requests (
+                topic_key TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                requests INTEGER NOT NULL,
+                last_requested REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS content_requests_count ON content_requests (requests);
+            """
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _has_lang_column(conn: sqlite3.Connection) -> bool:
+        return "lang" in [row[1] for row in conn.execute("PRAGMA table_info(content)")]
+
+    def _drop_lang_column(self, conn: sqlite3.Connection):
+        """
+        Migrate a store from when syllabus translations were warmed (one row per language): keep
+        the untranslated syllabus, assignment and quiz rows. Checked again under the write lock,
+        so only one of several processes starting together migrates.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._has_lang_column(conn):
+                conn.execute("ALTER TABLE content RENAME TO content_old")
+                conn.execute(
+                    "CREATE TABLE content (topic_key TEXT NOT NULL, kind TEXT NOT NULL, topic TEXT NOT NULL, value TEXT NOT NULL, "
+                    "version INTEGER NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (topic_key, kind))"
+                )
+                conn.execute(
+                    "INSERT INTO content SELECT topic_key, kind, topic, value, version, created_at FROM content_old "
+                    "WHERE lang = '' AND kind IN (%s)" % ", ".join("?" * len(KINDS)),
+                    KINDS,
+                )
+                conn.execute("DROP TABLE content_old")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def get(self, topic: str, kind: str) -> Optional[ContentEntry]:
+        row = self._conn().execute(
+            "SELECT value, created_at, version FROM content WHERE topic_key = ? AND kind = ?",
+            (normalize_topic(topic), kind),
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at, version = row
+        return ContentEntry(value, created_at, version, self._is_stale(created_at, version))
+
+    def _is_stale(self, created_at: float, version: int) -> bool:
+        return version != self.version or time.time() - created_at > self.max_age
+
+    def put(self, topic: str, kind: str, value: str):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO content (topic_key, kind, topic, value, version, created_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (topic_key, kind) DO UPDATE SET "
+                "topic = excluded.topic, value = excluded.value, version = excluded.version, created_at = excluded.created_at",
+                (normalize_topic(topic), kind, topic.strip(), value, self.version, time.time()),
+            )
+
+    def needs_refresh(self, topic: str, kinds: Sequence[str] = KINDS) -> List[str]:
+        """Kinds that are missing or stale for the topic."""
+        missing = []
+        for kind in kinds:
+            entry = self.get(topic, kind)
+            if entry is None or entry.stale:
+                missing.append(kind)
+        return missing
+
+    def log_request(self, topic: str):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO content_requests (topic_key, topic, requests, last_requested) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (topic_key) DO UPDATE SET requests = requests + 1, last_requested = excluded.last_requested",
+                (normalize_topic(topic), topic.strip(), time.time()),
+            )
+
+    def request_counts(self, limit: int = 100) -> Dict[str, int]:
+        """Requests per topic, most requested first."""
+        rows = self._conn().execute(
+            "SELECT topic, requests FROM content_requests ORDER BY requests DESC, last_requested DESC LIMIT ?", (limit,)
+        )
+        return dict(rows.fetchall())
+
+    def purge(self, older_than: float) -> int:
+        """Delete entries created more than `older_than` seconds ago. :return: Rows removed"""
+        conn = self._conn()
+        with conn:
+            return conn.execute("DELETE FROM content WHERE created_at < ?", (time.time() - older_than,)).rowcount
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        (entries,) = conn.execute("SELECT COUNT(*) FROM content").fetchone()
+        (topics,) = conn.execute("SELECT COUNT(DISTINCT topic_key) FROM content").fetchone()
+        (stale,) = conn.execute(
+            "SELECT COUNT(*) FROM content WHERE version != ? OR created_at < ?", (self.version, time.time() - self.max_age)
+        ).fetchone()
+        return {"entries": entries, "topics": topics, "stale": stale}
+
+
+class WarmupWorker:
+    """
+    Background thread that keeps the most popular topics generated ahead of time.
+
+    Popularity is the content store's request count plus the number of learners who completed
+    the topic in the progress tracker. Every `interval` seconds the top `top_k` topics get any
+    missing or stale kind regenerated (top_k=0 turns this pass off). Topics served stale by the
+    app are queued with enqueue() and refreshed at once, so the thread runs whatever top_k is.
+    """
+
+    def __init__(
+        self,
+        store: ContentStore,
+        generators: Dict[str, Callable[[str], str]],
+        top_k: int = 10,
+        interval: float = 3600,
+        topic_counts: Optional[Callable[[], Dict[str, int]]] = None,
+    ):
+        """
+        :param generators: kind -> fn(topic) producing the text, for kinds in KINDS
+        :param topic_counts: Extra popularity signal, e.g. ProgressTracker completions per topic
+        """
+        self.store = store
+        self.generators = generators
+        self.top_k = top_k
+        self.interval = interval
+        self.topic_counts = topic_counts
+        self.generated = 0
+        self.failures = 0
+        self._queue: List[str] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def candidates(self) -> List[str]:
+        if self.top_k <= 0:
+            return []
+        scores: Dict[str, float] = {}
+        names: Dict[str, str] = {}
+        counts = [self.store.request_counts(self.top_k * 4)]
+        if self.topic_counts is not None:
+            counts.append(self.topic_counts())
+        for source in counts:
+            for topic, count in source.items():
+                key = normalize_topic(topic)
+                if key:
+                    scores[key] = scores.get(key, 0) + count
+                    names.setdefault(key, topic.strip())
+        ranked = sorted(scores, key=scores.get, reverse=True)[: self.top_k]
+        return [names[key] for key in ranked]
+
+    def enqueue(self, topic: str):
+        with self._lock:
+            if topic not in self._queue:
+                self._queue.append(topic)
+        self._wake.set()
+
+    def warm(self, topic: str) -> int:
+        """Generate whatever is missing or stale for one topic. :return: Entries written"""
+        written = 0
+        for kind in self.store.needs_refresh(topic, [k for k in KINDS if k in self.generators]):
+            try:
+                value = self.generators[kind](topic)
+            except Exception:
+                self.failures += 1
+                continue
+            if value and not value.startswith("⚠️"):
+                self.store.put(topic, kind, value)
+                written += 1
+        self.generated += written
+        return written
+
+    def run_once(self) -> int:
+        with self._lock:
+            queued, self._queue = self._queue, []
+        written = 0
+        for topic in queued + [t for t in self.candidates() if t not in queued]:
+            if self._stop.is_set():
+                break
+            written += self.warm(topic)
+        return written
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self) -> "WarmupWorker":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="content-warmup")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def default_store() -> Optional[ContentStore]:
+    """Store configured from CONTENT_STORE (on/off), CONTENT_DB and CONTENT_MAX_AGE (seconds)."""
+    if os.getenv("CONTENT_STORE", "on").lower() in ("off", "0", "false", "none"):
+        return None
+    return ContentStore(os.getenv("CONTENT_DB", "content.sqlite3"), max_age=float(os.getenv("CONTENT_MAX_AGE", 7 * 24 * 3600)))
@@ -0,0 +1,151 @@
+# fake_llm.py
+
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+from tokens import count_message_tokens, count_tokens, record_usage
+
+
+def synthetic_response(messages: List[BaseMessage]) -> str:
+    """Default fake reply: a fixed-size solution paragraph that never finishes the dialogue."""
+    return "Solution: " + " ".join(["Cover the key concept with a worked example."] * 8) + " Next request."
+
+
+def synthetic(tokens: int) -> Callable[[List[BaseMessage]], str]:
+    """Fake reply of roughly `tokens` completion tokens (about one token per word)."""
+    words = ("Cover the key concept with a worked example and one short exercise. " * (tokens // 12 + 1)).split()
+    text = "Solution: " + " ".join(words[: max(tokens - 4, 1)]) + " Next request."
+    return lambda messages: text
+
+
+def recording_key(messages: List[BaseMessage]) -> str:
+    from llm_cache import ResponseCache
+
+    return ResponseCache.make_key("recording", None, messages)
+
+
+def replay(path: str, fallback: Callable[[List[BaseMessage]], str] = synthetic_response) -> Callable[[List[BaseMessage]], str]:
+    """
+    Responder that replays a recording made with ResponseRecorder: the reply recorded for the
+    same message list, or `fallback` for prompts that were never recorded.
+    """
+    recorded: Dict[str, str] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                recorded[entry["key"]] = entry["response"]
+    return lambda messages: recorded.get(recording_key(messages)) or fallback(messages)
+
+
+class ResponseRecorder(BaseCallbackHandler):
+    """Appends every (prompt key, reply) of a live model to a JSONL file for later replay."""
+
+    _lock = threading.Lock()  # shared: one recorder per client, all appending to the same file
+
+    def __init__(self, path: str):
+        self.path = path
+        self._keys: Dict[Any, str] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._keys[run_id] = recording_key(messages[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        key = self._keys.pop(run_id, None)
+        if key is None or response.llm_output and response.llm_output.get("cached"):
+            return
+        text = "".join(g.text for generations in response.generations for g in generations)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "response": text}, ensure_ascii=False) + "\n")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._keys.pop(run_id, None)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatOpenRouter.
+
+    `responses` is either a list that is replayed in order (cycling) or a callable that
+    receives the message list (see synthetic() and replay()). `latency` is slept per call
+    (before the first token when streaming), varied by up to +/- `latency_jitter` from a
+    seeded generator, and `token_latency` between streamed tokens. A `latency_script` replaces
+    `latency` with its values in order (cycling), e.g. to script occasional slow calls. Calls and prompt/completion
+    tokens are counted so benchmarks can compare call patterns without a network.
+    """
+
+    responses: Union[List[str], Callable[[List[BaseMessage]], str]] = Field(default=synthetic_response)
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    token_latency: float = 0.0
+    latency_script: List[float] = Field(default_factory=list)
+    seed: int = 0
+    scripted: int = 0
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    lock: Any = Field(default_factory=threading.Lock, exclude=True)
+    rng: Any = Field(default=None, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _sleep_latency(self):
+        delay = self.latency
+        if self.latency_script:
+            with self.lock:
+                delay = self.latency_script[self.scripted % len(self.latency_script)]
+                self.scripted += 1
+        if self.latency_jitter:
+            with self.lock:
+                if self.rng is None:
+                    self.rng = random.Random(self.seed)
+                delay += self.rng.uniform(-self.latency_jitter, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls = self.prompt_tokens = self.completion_tokens = 0
+
+    def _next_response(self, messages: List[BaseMessage]) -> str:
+        with self.lock:
+            index = self.calls
+            self.calls += 1
+            self.prompt_tokens += count_message_tokens(messages)
+        if callable(self.responses):
+            text = self.responses(messages)
+        else:
+            text = self.responses[index % len(self.responses)]
+        completion_tokens = count_tokens(text)
+        with self.lock:
+            self.completion_tokens += completion_tokens
+        record_usage(count_message_tokens(messages), completion_tokens)
+        return text
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._next_response(messages)
+        self._sleep_latency()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self._next_response(messages)
+        self._sleep_latency()
+        for index, token in enumerate(re.findall(r"\S+\s*|\s+", text)):
+            if index and self.token_latency:
+                time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
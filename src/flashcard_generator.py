@@ -1,31 +1,21 @@
 # flashcard_generator.py
 
-import os
+import concurrent.futures
+import contextvars
+import hashlib
+import re
+import threading
+from collections import defaultdict
+from typing import List, Sequence
 
-import langchain_community
 from dotenv import load_dotenv
-langchain_community.chat_models.ChatOpenAI,
 from langchain_core.messages import HumanMessage, SystemMessage
-from openrouter_llm import ChatOpenRouter  # ✅ Custom wrapper for OpenRouter
+import metrics
+import request_context
+from model_router import get_model  # ✅ Shared client for the flashcards tier, created on first use
 
 # ✅ Load environment variables
 load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
-
-if not api_key:
-    raise EnvironmentError("OPENROUTER_API_KEY not found in .env file.")
-
-# ✅ Set fallback OPENAI_API_KEY for LangChain compatibility
-os.environ["OPENAI_API_KEY"] = api_key
-
-# ✅ Setup the OpenRouter-compatible LLM
-llm = ChatOpenRouter(
-    temperature=0.7,
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    model="gpt-3.5-turbo-0613"
-
-)
 
 
 # ✅ Flashcard Generation Function
@@ -50,7 +40,121 @@ def generate_flashcards(content: str) -> str:
     ]
 
     try:
-        response = llm.invoke(messages)
+        with metrics.call_site("flashcards"), metrics.span("flashcards"):
+            response = get_model("flashcards", temperature=0.7).invoke(messages, **request_context.call_kwargs())
         return response.content
     except Exception as e:
         return f"⚠️ Flashcard generation failed: {str(e)}"
+
+
+def format_flashcards(cards) -> str:
+    return "\n\n".join(f"Q: {card.question}\nA: {card.answer}" for card in cards)
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class IncrementalFlashcards:
+    """
+    A flashcard deck that grows with the lecture.
+
+    update() only cards the utterances added since the last call: they are split into
+    chunks of at most `chunk_chars`, each chunk is carded concurrently (chunks that failed
+    last time are retried alongside), and new cards are
+    dropped if their question is an exact (normalized hash) or near duplicate (word-set
+    Jaccard >= `similarity`, looked up through an inverted index) of a card already in the deck.
+    """
+
+    def __init__(self, chunk_chars: int = 6000, max_workers: int = 4, similarity: float = 0.8):
+        self.chunk_chars = chunk_chars
+        self.max_workers = max_workers
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.cards = []
+        self.carded_turns = 0
+        self.duplicates_skipped = 0
+        self._failed_chunks = []  # chunk texts whose generation failed, retried on the next update
+        self._hashes = set()
+        self._word_sets = []
+        self._index = defaultdict(set)  # word -> positions in _word_sets
+
+    def update(self, history: Sequence[str], turn_count: int) -> List:
+        """
+        :param history: The agent's (possibly trimmed) conversation history
+        :param turn_count: Utterances ever added to the lecture (TeachingGPT.turn_count); the
+            agent starts a new deck when it is re-seeded
+        :return: Cards added by this call
+        """
+        with self._lock:
+            new_count = max(0, min(turn_count - self.carded_turns, len(history)))
+            new_turns = list(history[len(history) - new_count:]) if new_count else []
+            self.carded_turns += new_count
+            chunks = self._failed_chunks + [text for text, _ in self._chunk(new_turns)]
+            self._failed_chunks = []
+            if not chunks:
+                return []
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                # Each chunk runs in a copy of the caller's context (request deadline, metrics labels).
+                futures = [pool.submit(contextvars.copy_context().run, self._card_chunk, text) for text in chunks]
+                results = [future.result() for future in futures]
+
+            added = []
+            for text, (ok, cards) in zip(chunks, results):
+                if not ok:
+                    self._failed_chunks.append(text)  # only this chunk is generated again next time
+                    continue
+                for card in cards:
+                    if self._add(card):
+                        added.append(card)
+            return added
+
+    def _chunk(self, turns: Sequence[str]):
+        chunks, current, size = [], [], 0
+        for turn in turns:
+            if current and size + len(turn) > self.chunk_chars:
+                chunks.append(("\n".join(current), len(current)))
+                current, size = [], 0
+            current.append(turn)
+            size += len(turn)
+        if current:
+            chunks.append(("\n".join(current), len(current)))
+        return chunks
+
+    @staticmethod
+    def _card_chunk(text: str):
+        from study_models import parse_flashcards
+
+        output = generate_flashcards(text)
+        if output.startswith("⚠️ Flashcard generation failed"):
+            return False, []
+        return True, parse_flashcards(output)
+
+    def _add(self, card) -> bool:
+        words = frozenset(_WORD.findall(card.question.lower()))
+        digest = hashlib.sha1(" ".join(sorted(words)).encode("utf-8")).digest()
+        if digest in self._hashes or self._near_duplicate(words):
+            self.duplicates_skipped += 1
+            return False
+        self._hashes.add(digest)
+        position = len(self._word_sets)
+        self._word_sets.append(words)
+        for word in words:
+            self._index[word].add(position)
+        self.cards.append(card)
+        return True
+
+    def _near_duplicate(self, words: frozenset) -> bool:
+        if not words:
+            return False
+        candidates = set()
+        for word in words:
+            candidates |= self._index.get(word, set())
+        for position in candidates:
+            other = self._word_sets[position]
+            if len(words & other) / len(words | other) >= self.similarity:
+                return True
+        return False
@@ -2,14 +2,11 @@
 
 import os
 
-import langchain_community
-
-from flashcard_generator import generate_flashcards
-from multilingual_support import MultilingualSupport
-from progress_tracker import ProgressTracker
-from openrouter_llm import ChatOpenRouter
-langchain_community.chat_models.ChatOpenAI,
-from typing import List
+import metrics
+import request_context
+from llm_registry import get_chat_model
+from model_router import get_model
+from typing import Iterator, List, Optional
 from dotenv import load_dotenv
 
 from langchain_core.messages import (
@@ -27,22 +24,33 @@ from langchain.prompts.chat import (
 load_dotenv()
 API_KEY = os.getenv("OPENROUTER_API_KEY")  # Corrected key usage
 
-# ✅ Initialize multilingual & progress tracking
-multilingual = MultilingualSupport()
-progress_tracker = ProgressTracker()
+# ✅ Syllabus mode: "classic" (role-play dialogue) or "fast" (single structured-outline call)
+SYLLABUS_MODE = os.getenv("SYLLABUS_MODE", "classic")
+# Optional number of recent messages each dialogue agent resends (unset = whole history)
+SYLLABUS_HISTORY_WINDOW = int(os.getenv("SYLLABUS_HISTORY_WINDOW", 0)) or None
 
+# ✅ Multilingual support is created on first use
+_multilingual = None
 
 
+def get_multilingual():
+    global _multilingual
+    if _multilingual is None:
+        from multilingual_support import MultilingualSupport
 
-# ✅ Reusable LLM Getter
-def get_llm(temp=0.7):
-    return ChatOpenRouter(
-        temperature=temp,
-        base_url="https://openrouter.ai/api/v1",
-        api_key=API_KEY,
-        model="gpt-3.5-turbo-0613"
+        _multilingual = MultilingualSupport()
+    return _multilingual
 
-    )
+
+
+
+# ✅ Reusable LLM Getter
+def get_llm(temp=0.7, role=None):
+    # Shared client per temperature (see llm_registry.py), built on first use;
+    # with a role, the model comes from that role's tier (see model_router.py)
+    if role is not None:
+        return get_model(role, temperature=temp)
+    return get_chat_model(temperature=temp)
 
 
 
@@ -53,9 +61,11 @@ def get_llm(temp=0.7):
 
 # ✅ DiscussAgent Class
 class DiscussAgent:
-    def __init__(self, system_message: SystemMessage, model):
+    def __init__(self, system_message: SystemMessage, model, window: Optional[int] = None, role: str = "agent"):
         self.system_message = system_message
         self.model = model
+        self.window = window
+        self.role = role  # call-site label for metrics and traces
         self.init_messages()
 
     def reset(self):
@@ -68,12 +78,34 @@ class DiscussAgent:
         self.stored_messages.append(message)
         return self.stored_messages
 
+    def context_messages(self) -> List[BaseMessage]:
+        """
+        Messages sent to the model on the next step.
+        With a window, only the system prompt, the first input (which carries the task)
+        and the last `window` messages are resent instead of the whole growing history.
+        """
+        if self.window is None or len(self.stored_messages) <= self.window + 2:
+            return self.stored_messages
+        return self.stored_messages[:2] + self.stored_messages[-self.window:]
+
     def step(self, input_message: HumanMessage) -> AIMessage:
-        messages = self.update_messages(input_message)
-        output_message = self.model.invoke(messages)
+        self.update_messages(input_message)
+        with metrics.call_site(f"discuss_agent.{self.role}"), metrics.span(self.role):
+            output_message = self.model.invoke(self.context_messages(), **request_context.call_kwargs())
         self.update_messages(output_message)
         return output_message
 
+    def step_stream(self, input_message: HumanMessage) -> Iterator[str]:
+        """Like step(), but yields the reply accumulated so far after every streamed chunk."""
+        self.update_messages(input_message)
+        parts = []
+        with metrics.call_site(f"discuss_agent.{self.role}"), metrics.span(self.role):
+            for chunk in self.model.stream(self.context_messages(), **request_context.call_kwargs()):
+                request_context.check()
+                parts.append(chunk.content)
+                yield "".join(parts)
+        self.update_messages(AIMessage(content="".join(parts)))
+
 # ✅ Roles & Prompts
 assistant_role_name = "Instructor"
 user_role_name = "Teaching Assistant"
@@ -119,28 +151,97 @@ Please make it more specific. Be creative and imaginative.
 Please reply with the specified task in {word_limit} words or less. Do not add anything else."""
 task_specifier_template = HumanMessagePromptTemplate.from_template(template=task_specifier_prompt)
 
-task_specify_agent = DiscussAgent(
-    task_specifier_sys_msg,
-    get_llm(temp=1.0)
-)
+# ✅ Fast Syllabus Mode
+outline_sys_msg = SystemMessage(content="You are an experienced instructor who writes complete, well-structured course syllabi.")
+outline_prompt = """Here is a task: {task}.
+Write the course syllabus for the topic: {topic}.
+Structure it as numbered sections in teaching order. For each section give a title, the key concepts with a short example, and the learning objective.
+Finish with a short assessment plan.
+When the syllabus is complete, end your reply with <TASK_DONE>."""
+outline_continue_prompt = "Continue the syllabus exactly where you stopped. End your reply with <TASK_DONE> when it is complete."
+
+
+def generate_syllabus_fast(topic, task, max_rounds=2):
+    """
+    Produce the syllabus with one structured-outline call instead of the 13-call dialogue.
+    Stops as soon as the model signals <TASK_DONE>; only a cut-off reply triggers a
+    continuation, which resends just the task and the latest part.
+    """
+    with metrics.span("generate_syllabus", topic=topic, mode="fast"):
+        return _last(_outline_rounds(topic, task, max_rounds, stream=False))
+
+
+def _outline_rounds(topic, task, max_rounds, stream):
+    outline_agent = DiscussAgent(outline_sys_msg, get_llm(0.7, role="outline"), window=2, role="outline")
+    parts = []
+    message = HumanMessage(content=outline_prompt.format(topic=topic, task=task))
+    for _ in range(max_rounds):
+        for reply in _reply(outline_agent, message, stream):
+            yield "\n".join(parts + [reply]).replace("<TASK_DONE>", "").strip()
+        parts.append(reply)
+        if "<TASK_DONE>" in reply:
+            break
+        message = HumanMessage(content=outline_continue_prompt)
+
+
+def _reply(agent: DiscussAgent, message: HumanMessage, stream: bool) -> Iterator[str]:
+    """The agent's reply: streamed (growing text after every chunk) or as one final value."""
+    if stream:
+        yield from agent.step_stream(message)
+    else:
+        yield agent.step(message).content
+
+
+def _last(values: Iterator[str]) -> str:
+    value = ""
+    for value in values:
+        pass
+    return value
+
 
 # ✅ Syllabus Generator
-def generate_syllabus(topic, task):
+def generate_syllabus(topic, task, mode=None):
+    if (mode or SYLLABUS_MODE) == "fast":
+        return generate_syllabus_fast(topic, task)
+    with metrics.span("generate_syllabus", topic=topic, mode="classic"):
+        return _last(_syllabus_dialogue(topic, task, stream=False))
+
+
+def generate_syllabus_stream(topic, task, mode=None) -> Iterator[str]:
+    """
+    Same result as generate_syllabus, delivered progressively: the specified task first, then
+    the draft after every instructor turn, then the summary as it streams. Every value is the
+    complete text to display; the last one is the finished syllabus.
+    Closing the generator stops the dialogue before its next LLM call.
+    """
+    fast = (mode or SYLLABUS_MODE) == "fast"
+    with metrics.span("generate_syllabus", topic=topic, mode="fast" if fast else "classic"):
+        if fast:
+            yield from _outline_rounds(topic, task, 2, stream=True)
+        else:
+            yield from _syllabus_dialogue(topic, task, stream=True)
+
+
+def _syllabus_dialogue(topic, task, stream):
+    """The classic role-play dialogue; yields progress text, and finally the summarized syllabus."""
     task_specifier_msg = task_specifier_template.format_messages(
         assistant_role_name=assistant_role_name,
         user_role_name=user_role_name,
         task=task,
         word_limit=word_limit,
     )[0]
+    task_specify_agent = DiscussAgent(task_specifier_sys_msg, get_llm(temp=1.0, role="task_specifier"), role="task_specifier")
     specified_task_msg = task_specify_agent.step(task_specifier_msg)
     specified_task = specified_task_msg.content
+    header = f"📝 Specified task:\n{specified_task}\n\n"
+    yield header + "⏳ Drafting the syllabus..."
 
     assistant_sys_msg, user_sys_msg = get_sys_msgs(
         assistant_role_name, user_role_name, specified_task
     )
 
-    assistant_agent = DiscussAgent(assistant_sys_msg, get_llm(0.2))
-    user_agent = DiscussAgent(user_sys_msg, get_llm(0.2))
+    assistant_agent = DiscussAgent(assistant_sys_msg, get_llm(0.2, role="instructor"), window=SYLLABUS_HISTORY_WINDOW, role="instructor")
+    user_agent = DiscussAgent(user_sys_msg, get_llm(0.2, role="teaching_assistant"), window=SYLLABUS_HISTORY_WINDOW, role="teaching_assistant")
 
     assistant_agent.reset()
     user_agent.reset()
@@ -150,8 +251,9 @@ def generate_syllabus(topic, task):
     user_msg = assistant_agent.step(user_msg)
 
     conversation_history = []
+    drafts = []
 
-    for _ in range(5):
+    for turn in range(5):
         user_ai_msg = user_agent.step(assistant_msg)
         user_msg = HumanMessage(content=user_ai_msg.content)
         conversation_history.append("AI User: " + user_msg.content)
@@ -162,6 +264,8 @@ def generate_syllabus(topic, task):
         assistant_ai_msg = assistant_agent.step(user_msg)
         assistant_msg = HumanMessage(content=assistant_ai_msg.content)
         conversation_history.append("AI Assistant: " + assistant_msg.content)
+        drafts.append(assistant_msg.content)
+        yield header + f"⏳ Draft after turn {turn + 1} of up to 5:\n\n" + "\n\n".join(drafts)
 
     summarizer_sys_msg = SystemMessage(
         content=f"Summarize this conversation into a {topic} course syllabus form"
@@ -170,14 +274,13 @@ def generate_syllabus(topic, task):
 Please summarize this into a course syllabus with the topic from user input."""
     summarizer_template = HumanMessagePromptTemplate.from_template(template=summarizer_prompt)
 
-    summarizer_agent = DiscussAgent(summarizer_sys_msg, get_llm(1.0))
+    summarizer_agent = DiscussAgent(summarizer_sys_msg, get_llm(1.0, role="summarizer"), role="summarizer")
     summarizer_msg = summarizer_template.format_messages(
         assistant_role_name=assistant_role_name,
         user_role_name=user_role_name,
         conversation_history=conversation_history,
     )[0]
-    summarized_msg = summarizer_agent.step(summarizer_msg)
-    return summarized_msg.content
+    yield from _reply(summarizer_agent, summarizer_msg, stream)
 
 # ✅ Assignment Generator
 def generate_assignment(topic):
@@ -192,7 +295,8 @@ def generate_assignment(topic):
     """
     assignment_agent = DiscussAgent(
         SystemMessage(content="Generate assignments based on topics."),
-        get_llm(0.7)
+        get_llm(0.7, role="assignment"),
+        role="assignment",
     )
     input_msg = HumanMessage(content=assignment_prompt)
     output_msg = assignment_agent.step(input_msg)
@@ -226,7 +330,8 @@ def generate_quiz(topic):
 
     quiz_agent = DiscussAgent(
          SystemMessage(content="Generate quizzes with answers."),
-         get_llm(0.7)  # This should call ChatOpenRouter with correct model
+         get_llm(0.7, role="quiz"),  # This should call ChatOpenRouter with correct model
+         role="quiz",
     )
 
     input_msg = HumanMessage(content=quiz_prompt)
@@ -262,7 +367,8 @@ def generate_flashcards_from_content(content):
     """
     flashcard_agent = DiscussAgent(
         SystemMessage(content="Generate educational flashcards."),
-        get_llm(0.7)
+        get_llm(0.7, role="flashcards"),
+        role="flashcards",
     )
     input_msg = HumanMessage(content=flashcard_prompt)
     output_msg = flashcard_agent.step(input_msg)
@@ -270,7 +376,4 @@ def generate_flashcards_from_content(content):
 
 # ✅ Multilingual Translation
 def translate_output(content: str, languages=["ur", "fr", "de", "es"]) -> dict:
-    translations = {}
-    for lang in languages:
-        translations[lang] = multilingual.translate_text(content, lang)
-    return translations
+    return get_multilingual().translate_languages(content, languages)
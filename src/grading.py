@@ -0,0 +1,376 @@
+# grading.py
+"""
+Auto-grading of student submissions against a generated quiz.
+
+    python grading.py quiz.txt submissions.jsonl -o grades.jsonl
+
+The quiz is generate_quiz output (or a quiz JSON from Quiz.to_compact()). Each submission line is
+{"student": ..., "mcq": ["b", 2, ...], "short": ["...", ...], "long": ["..."]}; MCQ answers are
+option letters, 0-based indexes or numbered labels such as "2)" (counted from 1). Grades are
+appended to the output as each submission finishes.
+"""
+
+import argparse
+import concurrent.futures
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import metrics
+import request_context
+from llm_cache import MemoryLRU
+from study_models import OpenQuestion, Quiz, parse_quiz
+
+try:
+    import numpy as np
+except ImportError:  # optional: MCQ scoring falls back to plain Python
+    np = None
+
+QUIZ_TOPIC = "Quiz: {topic}"  # progress record written per graded submission
+SHORT_POINTS = 2.0
+LONG_POINTS = 5.0
+
+RUBRIC_PROMPT = """Write a grading rubric for this {kind} answer question on '{topic}'.
+Question: {question}
+{expected}
+List 3 to 5 key points a full-credit answer must contain, one per line, most important first. No preamble."""
+
+GRADING_SYSTEM_PROMPT = """You grade student answers to one {kind} answer question on '{topic}'.
+Question: {question}
+Rubric:
+{rubric}
+
+Score every answer from 0 to 10 against the rubric. Reply with exactly one line per answer, in order:
+<answer number> | <score> | <one-sentence feedback>"""
+
+MAX_OPTIONS = 8  # options a-h; any other index is not a valid answer
+_OPTION_LETTER = re.compile(r"^\(?([a-h])(?:[.)]|$)(?=\s|$)", re.IGNORECASE)
+_OPTION_NUMBER = re.compile(r"^\(?(\d+)[.)](?=\s|$)")
+_GRADE_LINE = re.compile(r"^\W*(\d+)\s*[|:.)-]\s*(\d+(?:\.\d+)?)\s*(?:/\s*10)?\s*(?:[|:-]\s*(.*))?$")
+
+
+@dataclass(slots=True)
+class Submission:
+    student: str
+    mcq: List[Union[str, int, None]] = field(default_factory=list)
+    short: List[str] = field(default_factory=list)
+    long: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Submission":
+        return cls(str(data["student"]), list(data.get("mcq", [])), list(data.get("short", [])), list(data.get("long", [])))
+
+
+@dataclass(slots=True)
+class GradeResult:
+    student: str
+    topic: str
+    mcq_correct: int = 0
+    mcq_total: int = 0
+    open_scores: List[Optional[float]] = field(default_factory=list)  # 0..1 per short, then long question; None = not graded
+    feedback: List[str] = field(default_factory=list)
+    score: float = 0.0
+    max_score: float = 0.0
+
+    @property
+    def percent(self) -> float:
+        return 100.0 * self.score / self.max_score if self.max_score else 0.0
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["percent"] = round(self.percent, 1)
+        return data
+
+
+def answer_index(answer: Union[str, int, None]) -> int:
+    """
+    MCQ answer as a 0-based option index: "b", "B)", "(b)" and "b. ..." -> 1; a bare index (1 or "1")
+    is 0-based, while a numbered label ("2)", "2.", "(2)") counts from 1 -> 1.
+
+    -1 when unanswered, out of range, or not a standalone option letter or number: "Answer: C",
+    "Because ...", and free text starting with the article "A" ("A lot of data").
+    """
+    if answer is None:
+        return -1
+    if isinstance(answer, int):
+        index = answer
+    else:
+        text = answer.strip()
+        letter = _OPTION_LETTER.match(text)
+        number = _OPTION_NUMBER.match(text)
+        if text.isdigit():
+            index = int(text)
+        elif letter:
+            index = ord(letter.group(1).lower()) - ord("a")
+        elif number:
+            index = int(number.group(1)) - 1
+        else:
+            return -1
+    return index if 0 <= index < MAX_OPTIONS else -1
+
+
+def score_mcqs(quiz: Quiz, submissions: Sequence[Submission]) -> List[int]:
+    """
+    Correct MCQ answers per submission, computed for the whole batch at once: an answer matrix
+    (students x questions) compared with the answer key. Questions without a marked answer score nothing.
+    """
+    key = [q.correct if q.correct is not None else -2 for q in quiz.mcqs]
+    if not key:
+        return [0] * len(submissions)
+    rows = [[answer_index(a) for a in (s.mcq + [None] * len(key))[: len(key)]] for s in submissions]
+    if np is not None:
+        return (np.asarray(rows, dtype=np.int16).reshape(len(rows), len(key)) == np.asarray(key, dtype=np.int16)).sum(axis=1).tolist()
+    return [sum(a == k for a, k in zip(row, key)) for row in rows]
+
+
+def _normalize_answer(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class Grader:
+    """
+    Grades submissions against one quiz. MCQs are scored locally; open answers are graded by the
+    LLM, `batch_size` answers per prompt. Each open question's rubric is written once (from the
+    quiz's expected answer when it has one) and cached, and goes first in every grading prompt so
+    the prompt prefix is shared. Identical answers (after normalizing whitespace and case) are
+    graded once and reuse the cached grade.
+    """
+
+    def __init__(self, llm=None, batch_size: int = 20, max_workers: int = 4, cache_entries: int = 100_000):
+        self._llm = llm
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rubrics = MemoryLRU(max_entries=4096)
+        self.grades = MemoryLRU(max_entries=cache_entries)
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from model_router import get_model
+
+            self._llm = get_model("grading", temperature=0.0)
+        return self._llm
+
+    def _invoke(self, messages) -> str:
+        with self._lock:
+            self.llm_calls += 1
+        with metrics.call_site("grading"):
+            return self.llm.invoke(messages, **request_context.call_kwargs()).content
+
+    def rubric(self, topic: str, kind: str, question: OpenQuestion) -> str:
+        key = _digest(topic, kind, question.question, question.expected)
+        rubric = self.rubrics.get(key)
+        if rubric is None:
+            expected = f"Reference answer: {question.expected}" if question.expected else ""
+            prompt = RUBRIC_PROMPT.format(kind=kind, topic=topic, question=question.question, expected=expected)
+            rubric = self._invoke([HumanMessage(content=prompt)]).strip()
+            self.rubrics.set(key, rubric)
+        return rubric
+
+    def grade_batch(self, topic: str, kind: str, question: OpenQuestion, answers: Sequence[str],
+                    retry: bool = True) -> List[Tuple[Optional[float], str]]:
+        """(score 0..1 or None, feedback) for each answer, in one LLM call. Answers the reply skipped are retried once."""
+        system = GRADING_SYSTEM_PROMPT.format(kind=kind, topic=topic, question=question.question, rubric=self.rubric(topic, kind, question))
+        numbered = "\n\n".join(f"Answer {i}:\n{answer.strip()}" for i, answer in enumerate(answers, 1))
+        reply = self._invoke([SystemMessage(content=system), HumanMessage(content=numbered)])
+        grades: Dict[int, Tuple[Optional[float], str]] = {}
+        for line in reply.splitlines():
+            match = _GRADE_LINE.match(line.strip())
+            if match and 1 <= int(match.group(1)) <= len(answers):
+                grades[int(match.group(1)) - 1] = (min(float(match.group(2)), 10.0) / 10, (match.group(3) or "").strip())
+        missing = [i for i in range(len(answers)) if i not in grades]
+        if missing and retry:
+            for i, grade in zip(missing, self.grade_batch(topic, kind, question, [answers[i] for i in missing], retry=False)):
+                grades[i] = grade
+        return [grades.get(i, (None, "Could not be graded automatically.")) for i in range(len(answers))]
+
+    def grade_stream(self, quiz: Quiz, submissions: Sequence[Submission], tracker=None, flush_every: int = 200) -> Iterator[GradeResult]:
+        """
+        Grade every submission, yielding each GradeResult as soon as all its answers are scored
+        (submissions with no open answers first). With a ProgressTracker, results are written as
+        one QUIZ_TOPIC record per student through backend.upsert_many, `flush_every` at a time.
+        """
+        for _, result in self._grade(quiz, submissions, tracker, flush_every):
+            yield result
+
+    def grade(self, quiz: Quiz, submissions: Sequence[Submission], tracker=None) -> List[GradeResult]:
+        """All results, in submission order."""
+        return [result for _, result in sorted(self._grade(quiz, submissions, tracker), key=lambda item: item[0])]
+
+    def _grade(self, quiz: Quiz, submissions: Sequence[Submission], tracker, flush_every: int = 200) -> Iterator[Tuple[int, GradeResult]]:
+        start = time.perf_counter()
+        open_questions = [("short", q, SHORT_POINTS) for q in quiz.short_answers] + [("long", q, LONG_POINTS) for q in quiz.long_answers]
+        results = []
+        for submission, correct in zip(submissions, score_mcqs(quiz, submissions)):
+            results.append(GradeResult(
+                submission.student, quiz.topic, mcq_correct=correct, mcq_total=len(quiz.mcqs),
+                open_scores=[None] * len(open_questions), feedback=[""] * len(open_questions),
+                score=float(correct), max_score=len(quiz.mcqs) + sum(points for _, _, points in open_questions),
+            ))
+
+        # Unique (question, normalized answer) pairs still to grade -> the submissions they score
+        slots: Dict[Tuple[int, str], List[int]] = {}
+        texts: Dict[Tuple[int, str], str] = {}  # first original wording, which is what the LLM sees
+        pending = [0] * len(submissions)
+        for s, submission in enumerate(submissions):
+            answers = list(submission.short[: len(quiz.short_answers)]) + [""] * (len(quiz.short_answers) - len(submission.short))
+            answers += list(submission.long[: len(quiz.long_answers)]) + [""] * (len(quiz.long_answers) - len(submission.long))
+            for q, answer in enumerate(answers):
+                if not answer or not answer.strip():
+                    self._apply(results[s], q, open_questions[q][2], (0.0, "No answer."))
+                    continue
+                normalized = _normalize_answer(answer)
+                cached = self.grades.get(_digest(quiz.topic, open_questions[q][1].question, normalized))
+                if cached is not None:
+                    self._apply(results[s], q, open_questions[q][2], tuple(json.loads(cached)))
+                    continue
+                slots.setdefault((q, normalized), []).append(s)
+                texts.setdefault((q, normalized), answer)
+                pending[s] += 1
+
+        records = []
+
+        def finished(s):
+            records.append((results[s].student, QUIZ_TOPIC.format(topic=quiz.topic), f"Scored {results[s].percent:.0f}%"))
+            if tracker is not None and len(records) >= flush_every:
+                tracker.backend.upsert_many(records)
+                records.clear()
+            metrics.registry.inc("grading_submissions_total")
+            return s, results[s]
+
+        for s in range(len(submissions)):
+            if pending[s] == 0:
+                yield finished(s)
+
+        batches = []
+        by_question: Dict[int, List[str]] = {}
+        for q, normalized in slots:
+            by_question.setdefault(q, []).append(normalized)
+        for q, answers in by_question.items():
+            for i in range(0, len(answers), self.batch_size):
+                batches.append((i, q, answers[i: i + self.batch_size]))
+        # Answers are in order of first appearance; interleaving the questions' batches lets the
+        # earliest submissions complete (and stream out) first.
+        batches = [(q, answers) for _, q, answers in sorted(batches, key=lambda b: b[:2])]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Tasks share the caller's context (request deadline, metrics labels). Rubrics come
+            # first so concurrent batches of one question do not each write it.
+            for future in [
+                pool.submit(contextvars.copy_context().run, self.rubric, quiz.topic, *open_questions[q][:2]) for q in by_question
+            ]:
+                try:
+                    future.result()
+                except request_context.Cancelled:
+                    raise
+                except Exception:
+                    pass  # the question's batches try again and report the failure per answer
+            futures = {
+                pool.submit(
+                    contextvars.copy_context().run, self.grade_batch, quiz.topic, *open_questions[q][:2], [texts[(q, a)] for a in answers]
+                ): (q, answers)
+                for q, answers in batches
+            }
+            for future in concurrent.futures.as_completed(futures):
+                q, answers = futures[future]
+                kind, question, points = open_questions[q]
+                try:
+                    grades = future.result()
+                except request_context.Cancelled:
+                    for other in futures:
+                        other.cancel()
+                    raise
+                except Exception as e:
+                    grades = [(None, f"Grading failed: {e}")] * len(answers)
+                for answer, grade in zip(answers, grades):
+                    if grade[0] is not None:
+                        self.grades.set(_digest(quiz.topic, question.question, answer), json.dumps(grade))
+                    for s in slots[(q, answer)]:
+                        self._apply(results[s], q, points, grade)
+                        pending[s] -= 1
+                        if pending[s] == 0:
+                            yield finished(s)
+
+        if tracker is not None and records:
+            tracker.backend.upsert_many(records)
+        metrics.registry.observe("grading_batch_seconds", time.perf_counter() - start)
+
+    @staticmethod
+    def _apply(result: GradeResult, q: int, points: float, grade: Tuple[Optional[float], str]):
+        score, feedback = grade
+        result.open_scores[q] = score
+        result.feedback[q] = feedback
+        if score is not None:
+            result.score += score * points
+
+
+def read_quiz(path: str) -> Quiz:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".json"):
+        return Quiz.from_compact(json.loads(text))
+    return parse_quiz(text, topic=os.path.splitext(os.path.basename(path))[0])
+
+
+def read_submissions(path: str) -> Iterable[Submission]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield Submission.from_dict(json.loads(line))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade student submissions against a generated quiz")
+    parser.add_argument("quiz", help="generate_quiz output (text) or Quiz JSON")
+    parser.add_argument("submissions", help="JSONL file of submissions")
+    parser.add_argument("-o", "--output", default="grades.jsonl")
+    parser.add_argument("--topic", default=None, help="quiz topic (default: the quiz file name)")
+    parser.add_argument("--batch-size", type=int, default=20, help="open answers graded per LLM call")
+    parser.add_argument("--workers", type=int, default=4, help="grading calls in flight")
+    parser.add_argument("--progress", action="store_true", help="record each score in the progress tracker")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    quiz = read_quiz(args.quiz)
+    if args.topic:
+        quiz.topic = args.topic
+    tracker = None
+    if args.progress:
+        from progress_tracker import ProgressTracker
+
+        tracker = ProgressTracker()
+    submissions = list(read_submissions(args.submissions))
+    grader = Grader(batch_size=args.batch_size, max_workers=args.workers)
+    start = time.perf_counter()
+    with open(args.output, "w", encoding="utf-8") as out:
+        for result in grader.grade_stream(quiz, submissions, tracker):
+            out.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+    elapsed = time.perf_counter() - start
+    json.dump({
+        "submissions": len(submissions),
+        "seconds": round(elapsed, 2),
+        "submissions_per_s": round(len(submissions) / elapsed, 1) if elapsed else 0.0,
+        "llm_calls": grader.llm_calls,
+    }, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
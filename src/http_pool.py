@@ -0,0 +1,168 @@
+# http_pool.py
+
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+
+import request_context
+from metrics import current_call_site, registry as metrics_registry
+from rate_limit import TokenBucket
+
+RETRY_STATUSES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+
+class PoolMetrics:
+    """Counters for the shared OpenRouter connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.pool_hits = 0
+        self.new_connections = 0
+        self.retries = 0
+        self.throttled = 0
+        self.throttle_wait_seconds = 0.0
+        self._seen_streams = set()
+
+    def record_response(self, response: httpx.Response):
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if stream is None:
+                return
+            # A network stream we have already seen means the request reused a keep-alive connection.
+            key = id(stream)
+            if key in self._seen_streams:
+                self.pool_hits += 1
+            else:
+                self.new_connections += 1
+                if len(self._seen_streams) > 4096:
+                    self._seen_streams.clear()
+                self._seen_streams.add(key)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_throttle(self, waited: float):
+        with self._lock:
+            self.throttled += 1
+            self.throttle_wait_seconds += waited
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "pool_hits": self.pool_hits,
+                "new_connections": self.new_connections,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "throttle_wait_seconds": round(self.throttle_wait_seconds, 3),
+            }
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """
+    httpx transport that rate-limits every attempt through a token bucket and retries
+    connection errors, 429 and 5xx responses with jittered exponential backoff
+    (honouring Retry-After when the server sends it).
+    """
+
+    def __init__(
+        self,
+        transport: Optional[httpx.BaseTransport] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        metrics: Optional[PoolMetrics] = None,
+    ):
+        self.transport = transport or httpx.HTTPTransport()
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics or PoolMetrics()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # "Full jitter": uniform in [0, base * 2^attempt], capped.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire()
+                if waited:
+                    self.metrics.record_throttle(waited)
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self.metrics.record_response(response)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self._backoff(attempt, response)
+                response.close()
+            attempt += 1
+            request_context.check()  # a cancelled request (e.g. a losing hedge) is not retried
+            self.metrics.record_retry()
+            metrics_registry.inc("llm_retries_total", site=current_call_site())
+            time.sleep(delay)
+
+    def close(self):
+        self.transport.close()
+
+
+metrics = PoolMetrics()
+metrics_registry.register_collector(lambda: [(f"http_pool_{name}", value, {}) for name, value in metrics.snapshot().items()])
+_http_client = None
+_openai_clients = {}
+_lock = threading.Lock()
+
+
+def shared_http_client() -> httpx.Client:
+    """
+    One keep-alive connection pool for every ChatOpenRouter instance, configured from the
+    environment: OPENROUTER_RATE / OPENROUTER_BURST (requests per second / bucket size),
+    OPENROUTER_MAX_RETRIES and OPENROUTER_MAX_CONNECTIONS.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            max_connections = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", 20))
+            rate = float(os.getenv("OPENROUTER_RATE", 10))
+            transport = ResilientTransport(
+                httpx.HTTPTransport(limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)),
+                rate_limiter=TokenBucket(rate, float(os.getenv("OPENROUTER_BURST", rate))) if rate > 0 else None,
+                max_retries=int(os.getenv("OPENROUTER_MAX_RETRIES", 4)),
+                metrics=metrics,
+            )
+            _http_client = httpx.Client(transport=transport, timeout=httpx.Timeout(120.0, connect=10.0))
+        return _http_client
+
+
+def shared_openai_client(api_key: str, base_url: str):
+    """OpenAI SDK client on the shared pool; retries are left to ResilientTransport."""
+    import openai
+
+    with _lock:
+        client = _openai_clients.get((api_key, base_url))
+    if client is None:
+        client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=shared_http_client())
+        with _lock:
+            client = _openai_clients.setdefault((api_key, base_url), client)
+    return client
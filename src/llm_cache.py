@@ -0,0 +1,211 @@
+# llm_cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class MemoryLRU:
+    """In-process LRU tier with optional TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, created_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, created_at or time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """On-disk tier. Entries expire after `ttl` seconds; the least recently used are evicted past `max_entries`."""
+
+    def __init__(self, path: str = ".llm_cache.sqlite", max_entries: int = 50000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, created_at: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, created_at or now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for chat completions.
+
+    Lookups go through the tiers in order (fastest first); a hit in a slower tier is
+    promoted into the faster ones. Writes go to every tier.
+    """
+
+    def __init__(self, tiers: Iterable[Any]):
+        self.tiers: List[Any] = list(tiers)
+        self.hits = [0] * len(self.tiers)
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], messages: Iterable[Any], stop: Optional[List[str]] = None) -> str:
+        """
+        Build the cache key from the model, the temperature and the normalized message list.
+
+        :param messages: LangChain messages (anything with `type` and `content`)
+        :return: Hex SHA-256 digest
+        """
+        normalized = [
+            [getattr(m, "type", "human"), _WHITESPACE.sub(" ", str(getattr(m, "content", m))).strip()]
+            for m in messages
+        ]
+        payload = json.dumps([model, temperature, normalized, stop or []], ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        for index, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:index]:
+                    faster.set(key, value)
+                with self._lock:
+                    self.hits[index] += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> dict:
+        hits = sum(self.hits)
+        total = hits + self.misses
+        return {
+            "hits": hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "hits_per_tier": {type(t).__name__: h for t, h in zip(self.tiers, self.hits)},
+            "entries_per_tier": {type(t).__name__: len(t) for t in self.tiers},
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> Optional[ResponseCache]:
+    """
+    Process-wide cache shared by every generator, configured from the environment:
+
+    LLM_CACHE=off disables caching; LLM_CACHE=memory skips the SQLite tier.
+    LLM_CACHE_PATH, LLM_CACHE_TTL (seconds) and LLM_CACHE_MAX_ENTRIES tune the tiers.
+    """
+    global _default_cache
+    mode = os.getenv("LLM_CACHE", "sqlite").lower()
+    if mode in ("off", "0", "false", "none"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            ttl = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+            max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 50000))
+            tiers = [MemoryLRU(max_entries=min(max_entries, 1024), ttl=ttl)]
+            if mode != "memory":
+                tiers.append(SQLiteCache(os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite"), max_entries=max_entries, ttl=ttl))
+            _default_cache = ResponseCache(tiers)
+            _register_metrics(_default_cache)
+        return _default_cache
+
+
+def _register_metrics(cache: ResponseCache):
+    from metrics import registry
+
+    def collect():
+        stats = cache.stats()
+        gauges = [("llm_cache_misses", stats["misses"], {}), ("llm_cache_hit_rate", stats["hit_rate"], {})]
+        gauges += [("llm_cache_hits", hits, {"tier": tier}) for tier, hits in stats["hits_per_tier"].items()]
+        return gauges
+
+    registry.register_collector(collect)
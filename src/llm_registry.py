@@ -0,0 +1,68 @@
+# llm_registry.py
+
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_MODEL = "gpt-3.5-turbo-0613"
+
+_clients: Dict[Tuple[str, float], object] = {}
+_factory: Optional[Callable[..., object]] = None
+_lock = threading.Lock()
+
+
+def _build_openrouter(model: str, temperature: float):
+    # Deferred import: LangChain and the OpenAI client are only loaded when the first model is needed.
+    from openrouter_llm import ChatOpenRouter
+
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if api_key:
+        # ✅ Fallback OPENAI_API_KEY for LangChain compatibility
+        os.environ.setdefault("OPENAI_API_KEY", api_key)
+    return ChatOpenRouter(model=model, temperature=temperature)
+
+
+def get_chat_model(temperature: float = 0.7, model: str = DEFAULT_MODEL):
+    """
+    Shared chat client for (model, temperature), created on first use.
+    Every generator goes through here, so a process builds each client once instead of at import time.
+    """
+    key = (model, float(temperature))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = (_factory or _build_openrouter)(model=model, temperature=temperature)
+                _attach_callbacks(client)
+                _clients[key] = client
+    return client
+
+
+def _attach_callbacks(client):
+    # Every call through a registry client is timed and attributed to its call site (see metrics.py).
+    from metrics import llm_callback
+
+    callbacks = getattr(client, "callbacks", None)
+    if callbacks is None:
+        callbacks = client.callbacks = []
+    if not isinstance(callbacks, list) or llm_callback in callbacks:
+        return
+    callbacks.append(llm_callback)
+    if os.getenv("LLM_RECORD_PATH"):
+        # Live replies are saved for offline replay (benchmark.py suite --replay).
+        from fake_llm import ResponseRecorder
+
+        callbacks.append(ResponseRecorder(os.getenv("LLM_RECORD_PATH")))
+
+
+def set_factory(factory: Optional[Callable[..., object]]):
+    """Swap the client factory (e.g. a fake model for tests and benchmarks); clears existing clients."""
+    global _factory
+    with _lock:
+        _factory = factory
+        _clients.clear()
+
+
+def clients() -> Dict[Tuple[str, float], object]:
+    return dict(_clients)
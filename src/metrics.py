@@ -0,0 +1,386 @@
+# metrics.py
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from tokens import count_message_tokens, count_tokens
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_call_site = contextvars.ContextVar("call_site", default="other")
+_action = contextvars.ContextVar("action", default="")
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    """Prometheus-style cumulative buckets plus a uniform reservoir sample for p50/p95/p99."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, reservoir_size: int = 2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._reservoir: List[float] = []
+        self._reservoir_size = reservoir_size
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if len(self._reservoir) < self._reservoir_size:
+            self._reservoir.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self._reservoir_size:
+                self._reservoir[slot] = value
+
+    def percentile(self, q: float) -> float:
+        if not self._reservoir:
+            return 0.0
+        ordered = sorted(self._reservoir)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self.collectors: List[Callable[[], List[Tuple[str, float, Dict[str, str]]]]] = []
+        self.traces = deque(maxlen=int(os.getenv("METRICS_TRACES_KEPT", 20)))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, float, Dict[str, str]]]]):
+        """Add a callable returning (name, value, labels) gauges that are read at exposition time."""
+        self.collectors.append(collector)
+
+    def percentiles(self) -> List[Tuple[str, Dict[str, str], int, float, float, float]]:
+        """(metric, labels, count, p50, p95, p99) for every histogram."""
+        with self._lock:
+            return [
+                (name, dict(labels), h.count, h.percentile(50), h.percentile(95), h.percentile(99))
+                for (name, labels), h in sorted(self.histograms.items())
+            ]
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{_format_labels(dict(labels))} {value:g}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                labels = dict(labels)
+                cumulative = 0
+                for bound, count in zip(self.buckets_of(h), h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+                for q in (50, 95, 99):
+                    lines.append(f"{name}_p{q}{_format_labels(labels)} {h.percentile(q):.6f}")
+        for collector in self.collectors:
+            for name, value, labels in collector():
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def buckets_of(histogram: Histogram):
+        return [f"{b:g}" for b in histogram.buckets] + ["+Inf"]
+
+    def dump(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = MetricsRegistry()
+
+
+# ✅ Call sites, actions and trace spans
+
+@contextlib.contextmanager
+def call_site(name: str):
+    """Attribute every LLM call made inside the block to `name`."""
+    token = _call_site.set(name)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+def current_call_site() -> str:
+    return _call_site.get()
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attrs", "children")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.attrs = attrs
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def format(self, depth: int = 0) -> str:
+        attrs = " ".join(f"{k}={v}" for k, v in self.attrs.items())
+        lines = [f"{'  ' * depth}{self.name:<{max(1, 28 - 2 * depth)}} {self.duration:7.2f}s  {attrs}".rstrip()]
+        lines += [child.format(depth + 1) for child in self.children]
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """
+    Trace span. Nested spans become children; when a root span ends it is kept in
+    registry.traces (only if METRICS_TRACE=on, so untraced requests cost nothing).
+    """
+    parent = _current_span.get()
+    if parent is None and os.getenv("METRICS_TRACE", "off").lower() not in ("1", "on", "true"):
+        yield None
+        return
+    current = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        if parent is None:
+            registry.traces.append(current)
+
+
+@contextlib.contextmanager
+def timed(name: str, **labels):
+    """Record the block's duration in `<name>_seconds` and its exceptions in `<name>_errors_total`."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        registry.inc(f"{name}_errors_total", error=type(e).__name__, **labels)
+        raise
+    finally:
+        registry.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+
+def instrument_action(name: str):
+    """
+    Decorator for Gradio handlers: records per-action latency and errors and sets the action
+    label on every LLM call made inside. Generator handlers are timed until exhausted,
+    with their time to first yield recorded separately.
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                def body():
+                    _action.set(name)
+                    with span(name):
+                        yield from fn(*args, **kwargs)
+
+                # Gradio may resume the generator from a different worker thread on every step,
+                # so each step runs in one private context that keeps the action label and span.
+                context = contextvars.copy_context()
+                steps = body()
+                start = time.perf_counter()
+                first = True
+                try:
+                    while True:
+                        try:
+                            item = context.run(next, steps)
+                        except StopIteration:
+                            return
+                        if first:
+                            registry.observe("action_first_output_seconds", time.perf_counter() - start, action=name)
+                            first = False
+                        yield item
+                except Exception as e:
+                    registry.inc("action_errors_total", action=name, error=type(e).__name__)
+                    raise
+                finally:
+                    context.run(steps.close)
+                    registry.observe("action_latency_seconds", time.perf_counter() - start, action=name)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _action.set(name)
+            start = time.perf_counter()
+            try:
+                with span(name):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                registry.inc("action_errors_total", action=name, error=type(e).__name__)
+                raise
+            finally:
+                registry.observe("action_latency_seconds", time.perf_counter() - start, action=name)
+                _action.reset(token)
+        return wrapper
+    return decorate
+
+
+# ✅ LLM call instrumentation (attached to every client built by llm_registry)
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records latency, time to first token, tokens, cache status and errors per call site."""
+
+    def __init__(self):
+        self._runs: Dict = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, prompt_tokens: int):
+        # Labels are captured at the start: streamed calls may finish in another context.
+        labels = (_call_site.get(), _action.get(), _current_span.get())
+        with self._lock:
+            self._runs[run_id] = [time.perf_counter(), prompt_tokens, None, [], labels]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, sum(count_message_tokens(batch) for batch in messages))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, sum(count_tokens(p) for p in prompts))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None:
+                if run[2] is None:
+                    run[2] = time.perf_counter()
+                run[3].append(token)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, prompt_tokens, first_token, streamed, labels = run
+        output = response.llm_output or {}
+        usage = output.get("token_usage") or {}
+        text = "".join(streamed) or "".join(g.text for gens in response.generations for g in gens)
+        # Streamed results have no llm_output; a replayed cache hit is flagged on its generation.
+        cached = output.get("cached") or any((g.generation_info or {}).get("cached") for gens in response.generations for g in gens)
+        cache = "hit" if cached else "miss"
+        record_llm_call(
+            time.perf_counter() - start,
+            usage.get("prompt_tokens") or prompt_tokens,
+            usage.get("completion_tokens") or count_tokens(text),
+            cache=cache,
+            first_token=(first_token - start) if first_token else None,
+            labels=labels,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            record_llm_call(0.0, 0, 0, error=type(error).__name__)
+        else:
+            record_llm_call(time.perf_counter() - run[0], run[1], 0, error=type(error).__name__, labels=run[4])
+
+
+llm_callback = LLMMetricsCallback()
+
+
+def record_llm_call(latency: float, prompt_tokens: int, completion_tokens: int, cache: str = "miss",
+                    error: Optional[str] = None, first_token: Optional[float] = None, labels: Tuple = None):
+    site, action, current = labels or (_call_site.get(), _action.get(), _current_span.get())
+    labels = {"site": site, "action": action}
+    registry.inc("llm_calls_total", cache=cache, **labels)
+    registry.observe("llm_call_latency_seconds", latency, **labels)
+    if first_token is not None:
+        registry.observe("llm_first_token_seconds", first_token, **labels)
+    registry.inc("llm_prompt_tokens_total", prompt_tokens, **labels)
+    registry.inc("llm_completion_tokens_total", completion_tokens, **labels)
+    if error:
+        registry.inc("llm_errors_total", error=error, **labels)
+    if current is not None:
+        current.attrs.update(
+            latency=f"{latency:.2f}s", tokens=f"{prompt_tokens}/{completion_tokens}", cache=cache, **({"error": error} if error else {})
+        )
+
+
+# ✅ Exposition
+
+def summary_table() -> str:
+    """Human-readable p50/p95/p99 table (used by the Metrics tab)."""
+    rows = [f"{'metric':<30}{'labels':<60}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}"]
+    for name, labels, count, p50, p95, p99 in registry.percentiles():
+        label_text = ",".join(f"{k}={v}" for k, v in labels.items() if v)
+        rows.append(f"{name:<30}{label_text:<60}{count:>7}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}")
+    return "\n".join(rows)
+
+
+def recent_traces(limit: int = 5) -> str:
+    return "\n\n".join(trace.format() for trace in list(registry.traces)[-limit:]) or "(no traces; set METRICS_TRACE=on)"
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics in Prometheus text format from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_):
+            pass
+
+        def do_GET(self):
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
+
+
+def start_file_dump(path: str, interval: float = 15.0) -> threading.Thread:
+    """Rewrite `path` with the Prometheus exposition every `interval` seconds (for node-exporter textfile collectors)."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.dump(path)
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=loop, daemon=True, name="metrics-dump")
+    thread.start()
+    return thread
@@ -0,0 +1,324 @@
+# model_router.py
+
+import concurrent.futures
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+import request_context
+from llm_registry import DEFAULT_MODEL, get_chat_model
+
+TIERS = ("fast", "standard", "quality")
+
+# Which tier each call role uses (roles are the DiscussAgent / metrics call-site names).
+ROLE_TIERS = {
+    "task_specifier": "fast",
+    "teaching_assistant": "fast",
+    "flashcards": "fast",
+    "instructor": "standard",
+    "assignment": "standard",
+    "quiz": "standard",
+    "lecture": "standard",
+    "grading": "standard",
+    "summarizer": "quality",
+    "outline": "quality",
+}
+
+
+class ModelStats:
+    """Rolling latency and error rate of one model over its last `window` calls."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)  # (seconds, ok)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self.samples.append((seconds, ok))
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(seconds for seconds, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self.samples:
+                return 0.0
+            return sum(not ok for _, ok in self.samples) / len(self.samples)
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class ModelRouter:
+    """
+    Routes each call role to the models of its tier, in order of preference.
+
+    Models whose recent error rate exceeds `max_error_rate` are tried last. A call still running
+    past the primary model's rolling p95 (once `min_samples` calls are known) gets a hedged
+    duplicate on the next model and whichever succeeds first wins; a failed call falls back to
+    the next model.
+    """
+
+    def __init__(
+        self,
+        tiers: Dict[str, List[str]],
+        role_tiers: Dict[str, str] = None,
+        hedge: bool = True,
+        min_samples: int = 20,
+        max_error_rate: float = 0.5,
+        max_workers: int = 32,
+    ):
+        self.tiers = tiers
+        self.role_tiers = dict(ROLE_TIERS if role_tiers is None else role_tiers)
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.stats: Dict[str, ModelStats] = {}
+        self.hedges = 0
+        self.hedges_won = 0
+        self.hedges_wasted = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    def models_for(self, role: Optional[str]) -> List[str]:
+        return self.tiers.get(self.role_tiers.get(role, "standard")) or [DEFAULT_MODEL]
+
+    def model_stats(self, model: str) -> ModelStats:
+        with self._lock:
+            stats = self.stats.get(model)
+            if stats is None:
+                stats = self.stats[model] = ModelStats()
+            return stats
+
+    def healthy(self, model: str) -> bool:
+        stats = self.model_stats(model)
+        return len(stats) < 5 or stats.error_rate() <= self.max_error_rate
+
+    def order(self, models: List[str]) -> List[str]:
+        """Configured order, with models that are currently failing moved to the back."""
+        healthy = [m for m in models if self.healthy(m)]
+        return healthy + [m for m in models if m not in healthy]
+
+    def count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        stats = self.model_stats(model)
+        if not self.hedge or len(stats) < self.min_samples:
+            return None
+        return stats.percentile(95)
+
+    def call(self, model: str, temperature: float, messages, stop, kwargs):
+        request_context.check()  # a losing hedge that has not started yet is skipped
+        start = time.perf_counter()
+        try:
+            message = get_chat_model(temperature=temperature, model=model).invoke(messages, stop=stop, **kwargs)
+        except request_context.Cancelled:
+            raise
+        except Exception:
+            self.model_stats(model).record(time.perf_counter() - start, False)
+            raise
+        self.model_stats(model).record(time.perf_counter() - start, True)
+        return message
+
+    def submit(self, *args) -> Tuple[concurrent.futures.Future, request_context.RequestContext]:
+        """
+        Start a call in a copy of the caller's context (metrics call site), under its own child of
+        the caller's request: cancelling it stops this call alone, at its next call boundary.
+        """
+        request = request_context.child()
+        return self._pool.submit(contextvars.copy_context().run, self._call_in, request, *args), request
+
+    def _call_in(self, request, *args):
+        with request_context.scope(request):
+            return self.call(*args)
+
+    def snapshot(self) -> Dict[str, Any]:
+        models = {
+            model: {
+                "calls": len(stats),
+                "p50": stats.percentile(50),
+                "p95": stats.percentile(95),
+                "error_rate": round(stats.error_rate(), 3),
+            }
+            for model, stats in list(self.stats.items())
+        }
+        return {"models": models, "hedges": self.hedges, "hedges_won": self.hedges_won,
+                "hedges_wasted": self.hedges_wasted, "fallbacks": self.fallbacks}
+
+    def metrics(self):
+        """Collector for metrics.registry."""
+        gauges = [("model_router_hedges_total", self.hedges, {}), ("model_router_hedges_won_total", self.hedges_won, {}),
+                  ("model_router_hedges_wasted_total", self.hedges_wasted, {}), ("model_router_fallbacks_total", self.fallbacks, {})]
+        for model, stats in self.snapshot()["models"].items():
+            gauges.append(("model_router_error_rate", stats["error_rate"], {"model": model}))
+            if stats["p95"] is not None:
+                gauges.append(("model_router_p95_seconds", stats["p95"], {"model": model}))
+        return gauges
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model for one call role: hedges and falls back across the role's tier (see ModelRouter)."""
+
+    router: Any = Field(exclude=True)
+    role: str = "standard"
+    temperature: float = 0.7
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        router = self.router
+        order = router.order(router.models_for(self.role))
+        pending: Dict[concurrent.futures.Future, Tuple[str, request_context.RequestContext]] = {}
+        next_model = 0
+        errors = []
+
+        def launch():
+            nonlocal next_model
+            model = order[next_model]
+            next_model += 1
+            future, request = router.submit(model, self.temperature, messages, stop, kwargs)
+            pending[future] = (model, request)
+            delay = router.hedge_delay(model)
+            return time.monotonic() + delay if delay is not None else None
+
+        try:
+            hedge_at = launch()
+            while pending:
+                can_hedge = hedge_at is not None and next_model < len(order) and router.healthy(order[next_model])
+                wait_for = max(hedge_at - time.monotonic(), 0) if can_hedge else None
+                done, _ = concurrent.futures.wait(pending, timeout=wait_for, return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    # The call is slower than this model's usual p95: race a duplicate on the next model.
+                    router.count("hedges")
+                    hedge_at = launch()
+                    continue
+                for future in done:
+                    model, _ = pending.pop(future)
+                    try:
+                        message = future.result()
+                    except request_context.Cancelled:
+                        raise
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    if model != order[0] and len(errors) == 0:
+                        router.count("hedges_won")
+                    return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"model_name": model})
+                if not pending and next_model < len(order):
+                    router.count("fallbacks")
+                    hedge_at = launch()
+            raise errors[-1]
+        finally:
+            # Calls still running lost the race (or the caller gave up): cancel them so they stop
+            # at their next call boundary instead of spending a second reply.
+            for future, (_, request) in pending.items():
+                request.cancel("lost the hedge race")
+                if not future.done():
+                    router.count("hedges_wasted")
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        """Streams from the first healthy model; falls back only if a model fails before its first chunk."""
+        router = self.router
+        error = None
+        for index, model in enumerate(router.order(router.models_for(self.role))):
+            if index:
+                router.count("fallbacks")
+            start = time.perf_counter()
+            started = False
+            try:
+                for chunk in get_chat_model(temperature=self.temperature, model=model).stream(messages, stop=stop, **kwargs):
+                    started = True
+                    generation = ChatGenerationChunk(message=AIMessageChunk(content=chunk.content))
+                    if run_manager:
+                        run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                    yield generation
+            except request_context.Cancelled:
+                raise
+            except Exception as e:
+                router.model_stats(model).record(time.perf_counter() - start, False)
+                if started:
+                    raise
+                error = e
+                continue
+            router.model_stats(model).record(time.perf_counter() - start, True)
+            return
+        raise error
+
+
+_router: Optional[ModelRouter] = None
+_models: Dict[Any, Any] = {}
+_lock = threading.Lock()
+
+
+def _parse_tiers() -> Dict[str, List[str]]:
+    return {
+        tier: [m.strip() for m in os.getenv(f"MODEL_TIER_{tier.upper()}", DEFAULT_MODEL).split(",") if m.strip()]
+        for tier in TIERS
+    }
+
+
+def get_router() -> ModelRouter:
+    """
+    Process-wide router configured from MODEL_TIER_FAST / _STANDARD / _QUALITY (comma-separated
+    models, preferred first), MODEL_ROLE_TIERS ("summarizer=quality,flashcards=fast" overrides)
+    and MODEL_HEDGING (on/off).
+    """
+    global _router
+    with _lock:
+        if _router is None:
+            role_tiers = dict(ROLE_TIERS)
+            for pair in os.getenv("MODEL_ROLE_TIERS", "").split(","):
+                if "=" in pair:
+                    role, tier = pair.split("=", 1)
+                    role_tiers[role.strip()] = tier.strip()
+            _router = ModelRouter(
+                _parse_tiers(),
+                role_tiers,
+                hedge=os.getenv("MODEL_HEDGING", "on").lower() in ("1", "on", "true"),
+            )
+            from metrics import registry
+
+            registry.register_collector(_router.metrics)
+        return _router
+
+
+def set_router(router: Optional[ModelRouter]):
+    """Replace the process-wide router (tests and benchmarks); clears the per-role models."""
+    global _router
+    with _lock:
+        _router = router
+        _models.clear()
+
+
+def get_model(role: str, temperature: float = 0.7):
+    """
+    Chat model for a call role. A role whose tier is a single model gets that model's shared
+    client directly; only tiers with alternatives pay for routing.
+    """
+    router = get_router()
+    models = router.models_for(role)
+    if len(models) == 1:
+        return get_chat_model(temperature=temperature, model=models[0])
+    key = (role, float(temperature))
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = RoutedChatModel(router=router, role=role, temperature=temperature)
+        return model
@@ -1,10 +1,20 @@
-from deep_translator import GoogleTranslator
-from typing import List, Union
+from typing import Dict, List, Sequence, Union
+
+import metrics
+from translation_engine import TranslationEngine, default_engine
 
 
 class MultilingualSupport:
-    def __init__(self):
+    def __init__(self, engine: TranslationEngine = None):
         self.default_language = "ur"
+        self._engine = engine
+
+    @property
+    def engine(self) -> TranslationEngine:
+        # Shared engine (reused translators, chunking, concurrency, rate limiting, caching), built on first use
+        if self._engine is None:
+            self._engine = default_engine()
+        return self._engine
 
     def translate_text(self, text: str, dest_language: str = None) -> str:
         """
@@ -16,7 +26,8 @@ class MultilingualSupport:
         """
         dest_language = dest_language or self.default_language
         try:
-            return GoogleTranslator(source='auto', target=dest_language).translate(text)
+            with metrics.timed("translation", lang=dest_language):
+                return self.engine.translate(text, dest_language)
         except Exception as e:
             return f"Translation error: {str(e)}"
 
@@ -33,7 +44,23 @@ class MultilingualSupport:
         if isinstance(texts, str):
             return self.translate_text(texts, dest_language)
 
-        translated_list = []
-        for text in texts:
-            translated_list.append(self.translate_text(text, dest_language))
-        return translated_list
+        try:
+            return self.engine.translate_many(texts, dest_language)
+        except Exception as e:
+            return [f"Translation error: {str(e)}" for _ in texts]
+
+    def translate_languages(self, text: str, languages: Sequence[str]) -> Dict[str, str]:
+        """
+        Translate one text into several languages at once.
+
+        :param text: Text to translate
+        :param languages: Language codes to translate into
+        :return: Mapping of language code -> translated string or error message
+        """
+        try:
+            # No language label: one value per combination of languages would grow without bound.
+            with metrics.timed("translation_batch"):
+                return self.engine.translate_languages(text, languages)
+        except Exception:
+            # Fall back per language so one failing language does not hide the others.
+            return {lang: self.translate_text(text, lang) for lang in languages}
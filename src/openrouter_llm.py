@@ -1,17 +1,78 @@
 # openrouter_llm.py
 from langchain_community.chat_models import ChatOpenAI
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+from typing import Any
 import os
 
+from http_pool import shared_openai_client
+from llm_cache import ResponseCache, default_cache
+from tokens import count_message_tokens, count_tokens, record_usage
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
 class ChatOpenRouter(ChatOpenAI):
+    # ✅ Shared response cache (see llm_cache.py); None disables caching for this client
+    response_cache: Any = Field(default=None, exclude=True)
+
     def __init__(self, model: str = "openai/gpt-3.5-turbo-0613", temperature: float = 0.7, **kwargs):
         api_key = os.getenv("OPENROUTER_API_KEY")
         if not api_key:
             raise ValueError("OPENROUTER_API_KEY not found in environment variables.")
 
+        kwargs.setdefault("response_cache", default_cache())
+        # ✅ Every instance, whatever its temperature, shares one keep-alive pool with rate limiting and retries
+        kwargs.setdefault("client", shared_openai_client(api_key, OPENROUTER_BASE_URL).chat.completions)
         super().__init__(
             model=model,
-            openai_api_base="https://openrouter.ai/api/v1",  # ✅ must be here, not `base_url`
+            openai_api_base=OPENROUTER_BASE_URL,  # ✅ must be here, not `base_url`
             openai_api_key=api_key,
             temperature=temperature,
             **kwargs
         )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # Every entry point (invoke, LLMChain, generate) funnels through here, so this is
+        # the single place the cache has to sit.
+        if self.response_cache is None:
+            return self._generate_uncached(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        key = ResponseCache.make_key(self.model_name, self.temperature, messages, stop)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return ChatResult(
+                generations=[ChatGeneration(message=AIMessage(content=cached))],
+                llm_output={"token_usage": {}, "model_name": self.model_name, "cached": True},
+            )
+
+        result = self._generate_uncached(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self.response_cache.set(key, result.generations[0].message.content)
+        return result
+
+    def _generate_uncached(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        record_usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # Cache hits are replayed as a single chunk; fresh streams are stored once complete.
+        key = None
+        if self.response_cache is not None:
+            key = ResponseCache.make_key(self.model_name, self.temperature, messages, stop)
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                # Marked like a cached _generate result so metrics count it as a hit, not a call.
+                yield ChatGenerationChunk(message=AIMessageChunk(content=cached), generation_info={"cached": True})
+                return
+
+        parts = []
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            parts.append(chunk.text)
+            yield chunk
+        text = "".join(parts)
+        # Streamed responses carry no usage block, so both sides are estimated.
+        record_usage(count_message_tokens(messages), count_tokens(text))
+        if key is not None:
+            self.response_cache.set(key, text)
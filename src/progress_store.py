@@ -0,0 +1,156 @@
+# progress_store.py
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+DEFAULT_USER = "default"
+
+
+class JSONBackend:
+    """
+    The original progress.json format: one flat {topic: status} mapping shared by everyone.
+    Writes are atomic (temp file + rename) and serialized within the process, but every
+    update still rewrites the whole file, so use SQLiteBackend for many users or workers.
+    """
+
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, file_path: str = "progress.json"):
+        self.file_path = file_path
+        # Every instance pointing at the same file shares one lock.
+        with self._locks_guard:
+            self._lock = self._locks.setdefault(os.path.abspath(file_path), threading.Lock())
+        if not os.path.exists(self.file_path):
+            self._write({})
+
+    def _read(self) -> Dict[str, str]:
+        with open(self.file_path, "r") as f:
+            return json.load(f)
+
+    def _write(self, data: Dict[str, str]):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.file_path)), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.file_path)
+
+    def upsert(self, user_id: str, topic: str, status: str):
+        self.upsert_many([(user_id, topic, status)])
+
+    def upsert_many(self, records: Iterable[Tuple[str, str, str]]):
+        with self._lock:
+            data = self._read()
+            for _, topic, status in records:
+                data[topic] = status
+            self._write(data)
+
+    def get_user(self, user_id: str) -> Dict[str, str]:
+        with self._lock:
+            return self._read()
+
+    def topics_with_status(self, user_id: str, status: str) -> List[str]:
+        return [topic for topic, s in self.get_user(user_id).items() if s == status]
+
+    def topic_counts(self, status: str = None) -> Dict[str, int]:
+        return {topic: 1 for topic, s in self.get_user(DEFAULT_USER).items() if status is None or s == status}
+
+
+class SQLiteBackend:
+    """
+    Per-user progress in SQLite (WAL mode): single-record upserts are atomic and safe across
+    threads and worker processes, and lookups by user or status use indexes.
+    """
+
+    def __init__(self, db_path: str = "progress.sqlite3"):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS progress (
+                user_id TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_id, topic)
+            );
+            CREATE INDEX IF NOT EXISTS progress_user_status ON progress (user_id, status);
+            CREATE INDEX IF NOT EXISTS progress_topic ON progress (topic, status);
+            CREATE TABLE IF NOT EXISTS progress_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite serializes writers and WAL keeps readers unblocked.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, user_id: str, topic: str, status: str):
+        self.upsert_many([(user_id, topic, status)])
+
+    def upsert_many(self, records: Iterable[Tuple[str, str, str]]):
+        """Write a batch of (user_id, topic, status) records in one transaction."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO progress (user_id, topic, status, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, topic) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                [(user_id, topic, status, now) for user_id, topic, status in records],
+            )
+
+    def get_user(self, user_id: str) -> Dict[str, str]:
+        rows = self._conn().execute(
+            "SELECT topic, status FROM progress WHERE user_id = ? ORDER BY updated_at", (user_id,)
+        )
+        return dict(rows.fetchall())
+
+    def topics_with_status(self, user_id: str, status: str) -> List[str]:
+        rows = self._conn().execute(
+            "SELECT topic FROM progress WHERE user_id = ? AND status = ? ORDER BY updated_at", (user_id, status)
+        )
+        return [row[0] for row in rows.fetchall()]
+
+    def topic_counts(self, status: str = None) -> Dict[str, int]:
+        """Number of users per topic (optionally only with the given status), most popular first."""
+        if status is None:
+            rows = self._conn().execute("SELECT topic, COUNT(*) FROM progress GROUP BY topic ORDER BY 2 DESC")
+        else:
+            rows = self._conn().execute(
+                "SELECT topic, COUNT(*) FROM progress WHERE status = ? GROUP BY topic ORDER BY 2 DESC", (status,)
+            )
+        return dict(rows.fetchall())
+
+    def migrate_json(self, json_path: str, user_id: str = DEFAULT_USER) -> int:
+        """
+        Import a legacy progress.json into `user_id`. Runs once per file; later calls return 0.
+        :return: Number of imported topics
+        """
+        key = "migrated:" + os.path.abspath(json_path)
+        conn = self._conn()
+        if not os.path.exists(json_path) or conn.execute("SELECT 1 FROM progress_meta WHERE key = ?", (key,)).fetchone():
+            return 0
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        now = time.time()
+        with conn:
+            # Claiming the marker first makes the import atomic: when several processes start at
+            # once, only the one whose marker insert lands imports; the others see rowcount 0.
+            if not conn.execute("INSERT OR IGNORE INTO progress_meta (key, value) VALUES (?, ?)", (key, str(now))).rowcount:
+                return 0
+            conn.executemany(
+                "INSERT OR IGNORE INTO progress (user_id, topic, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(user_id, topic, status, now) for topic, status in data.items()],
+            )
+        return len(data)
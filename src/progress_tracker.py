@@ -3,25 +3,41 @@
 import os
 import json
 
+from progress_store import DEFAULT_USER, JSONBackend, SQLiteBackend
+
+COMPLETED = "Completed "
+
+
 class ProgressTracker:
-    def __init__(self, file_path="progress.json"):
+    def __init__(self, file_path="progress.json", backend=None, user_id=DEFAULT_USER):
+        """
+        :param file_path: Legacy progress.json; imported into the SQLite backend on first use
+        :param backend: Storage backend (defaults to PROGRESS_BACKEND: "sqlite" or "json")
+        :param user_id: User whose progress is read and updated when no user_id is given
+        """
         self.file_path = file_path
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, "w") as f:
-                json.dump({}, f)
+        self.user_id = user_id
+        if backend is None:
+            if os.getenv("PROGRESS_BACKEND", "sqlite").lower() == "json":
+                backend = JSONBackend(file_path)
+            else:
+                backend = SQLiteBackend(os.getenv("PROGRESS_DB", "progress.sqlite3"))
+                backend.migrate_json(file_path)
+        self.backend = backend
+
+    def get_progress(self, user_id=None):
+        return self.backend.get_user(user_id or self.user_id)
 
-    def get_progress(self):
-        with open(self.file_path, "r") as f:
-            return json.load(f)
+    def completed_topics(self, user_id=None):
+        return self.backend.topics_with_status(user_id or self.user_id, COMPLETED)
 
-    def update_progress(self, topic: str):
+    def update_progress(self, topic: str, user_id=None):
         """
         Marks the given topic as completed.
         :param topic: str - The topic or concept name
+        :param user_id: str - Learner to update (defaults to the tracker's user)
         :return: Updated progress as a JSON string
         """
-        data = self.get_progress()
-        data[topic] = "Completed "
-        with open(self.file_path, "w") as f:
-            json.dump(data, f, indent=2)
-        return json.dumps(data, indent=2)
+        user_id = user_id or self.user_id
+        self.backend.upsert(user_id, topic, COMPLETED)
+        return json.dumps(self.get_progress(user_id), indent=2)
@@ -0,0 +1,189 @@
+# request_context.py
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from typing import Dict, Hashable, Optional
+
+# Upper bound for any single LLM call (seconds); unset = only the request deadline applies.
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", 0)) or None
+
+_current = contextvars.ContextVar("request_context", default=None)
+
+
+class Cancelled(Exception):
+    """The request was abandoned (tab closed, superseded, or a sibling task gave up)."""
+
+
+class DeadlineExceeded(Cancelled):
+    """The request ran out of its time budget."""
+
+
+class RequestContext:
+    """
+    Deadline and cancel token for one user action, checked at every LLM/translation call
+    boundary. A child context is cancelled with its parent and never outlives it.
+    """
+
+    __slots__ = ("deadline", "parent", "reason", "_cancelled")
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["RequestContext"] = None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.parent = parent
+        self.reason = None
+        self._cancelled = threading.Event()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the nearest deadline in the chain (None = unbounded)."""
+        own = self.deadline - time.monotonic() if self.deadline is not None else None
+        inherited = self.parent.remaining() if self.parent is not None else None
+        if own is None or inherited is None:
+            return own if inherited is None else inherited
+        return min(own, inherited)
+
+    def check(self):
+        """Raise if the work should stop; called before every outgoing call."""
+        if self.cancelled:
+            context = self
+            while context is not None and not context._cancelled.is_set():
+                context = context.parent
+            raise Cancelled(context.reason if context is not None else "cancelled")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("time budget exhausted")
+
+    def child(self, timeout: Optional[float] = None) -> "RequestContext":
+        return RequestContext(timeout, parent=self)
+
+
+def current() -> Optional[RequestContext]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def scope(context: Optional[RequestContext]):
+    """Make `context` the current request context inside the block."""
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def child(timeout: Optional[float] = None) -> RequestContext:
+    """A new context under the current one (or a root context when there is none)."""
+    return RequestContext(timeout, parent=current())
+
+
+def check():
+    context = current()
+    if context is not None:
+        context.check()
+
+
+def call_kwargs() -> Dict[str, float]:
+    """
+    Check the current request and return the per-call keyword arguments for the next model call:
+    {"timeout": seconds} bounded by the request deadline and LLM_CALL_TIMEOUT.
+    """
+    context = current()
+    timeout = LLM_CALL_TIMEOUT
+    if context is not None:
+        context.check()
+        remaining = context.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+    return {"timeout": timeout} if timeout is not None else {}
+
+
+class ActiveRequests:
+    """The latest request per key (e.g. session and action): starting a new one cancels the one it supersedes."""
+
+    def __init__(self):
+        self._active: Dict[Hashable, RequestContext] = {}
+        self._lock = threading.Lock()
+
+    def start(self, key: Hashable, timeout: Optional[float] = None) -> RequestContext:
+        context = RequestContext(timeout)
+        with self._lock:
+            previous = self._active.get(key)
+            self._active[key] = context
+        if previous is not None:
+            previous.cancel("superseded by a newer request")
+        return context
+
+    def finish(self, key: Hashable, context: RequestContext):
+        with self._lock:
+            if self._active.get(key) is context:
+                del self._active[key]
+
+    def __len__(self):
+        return len(self._active)
+
+
+active_requests = ActiveRequests()
+
+
+def _request_key(action, args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        session = getattr(value, "session_hash", None)
+        if session is not None:
+            return session, action
+    return object()  # no session to tell users apart: never supersede
+
+
+def bounded(action: str, timeout: Optional[float] = None):
+    """
+    Decorator for Gradio handlers: runs the handler under a RequestContext with `timeout`.
+    A newer call of the same action from the same browser session (found through the
+    gr.Request argument) cancels the older one, and closing a generator handler (the client
+    went away) cancels whatever it still had in flight.
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                key = _request_key(action, args, kwargs)
+                request = active_requests.start(key, timeout)
+                # Each step may run on another thread; one private context keeps the request current.
+                context = contextvars.copy_context()
+                context.run(_current.set, request)
+                steps = fn(*args, **kwargs)
+                try:
+                    while True:
+                        try:
+                            item = context.run(next, steps)
+                        except StopIteration:
+                            return
+                        yield item
+                finally:
+                    request.cancel("closed")
+                    context.run(steps.close)
+                    active_requests.finish(key, request)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = _request_key(action, args, kwargs)
+            request = active_requests.start(key, timeout)
+            try:
+                with scope(request):
+                    return fn(*args, **kwargs)
+            finally:
+                request.cancel("finished")
+                active_requests.finish(key, request)
+        return wrapper
+    return decorate
@@ -1,20 +1,28 @@
 # run.py
 
+import functools
 import os
-import time
 import gradio as gr
 from dotenv import load_dotenv
 
-from openrouter_llm import ChatOpenRouter
+from model_router import get_model
 
-from generating_syllabus import generate_syllabus, generate_assignment, generate_quiz
+from generating_syllabus import generate_syllabus, generate_syllabus_stream, generate_assignment, generate_quiz
 
-from teaching_agent import TeachingGPT
+from teaching_agent import InstructorConversationChain, TeachingGPT
+from session_manager import SessionManager
 
-from flashcard_generator import generate_flashcards
+from flashcard_generator import IncrementalFlashcards, format_flashcards
 
 from multilingual_support import MultilingualSupport
-from progress_tracker import ProgressTracker
+from progress_tracker import COMPLETED, ProgressTracker
+from concurrent_tasks import stream_concurrently
+from single_flight import SingleFlight, make_key
+import request_context
+from admission import BUSY_MESSAGE, default_controller
+from content_store import WarmupWorker, default_store
+from transcript_store import default_transcript_store
+import metrics
 
 
 # ✅ Load .env variables
@@ -23,25 +31,133 @@ API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not API_KEY:
     raise ValueError("Missing OPENROUTER_API_KEY in .env file")
 
-# ✅ Initialize OpenRouter-compatible model
-
-
-llm = ChatOpenRouter(
-    temperature=0.7,
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    model="gpt-3.5-turbo-0613"
-
+# ✅ Teaching Agents: one lightweight TeachingGPT per browser session, all sharing one chain
+# (the chain and its OpenRouter client are built when the first session needs them)
+@functools.lru_cache(maxsize=None)
+def get_instructor_chain():
+    return InstructorConversationChain.from_llm(get_model("lecture", temperature=0.7), verbose=False)
+
+
+# ✅ Lectures survive restarts: every turn is appended to a compressed transcript, and a session
+# that is not in memory resumes from the tail of its transcript
+transcripts = default_transcript_store()
+if transcripts is not None:
+    metrics.registry.register_collector(lambda: [(f"transcript_store_{k}", v, {}) for k, v in transcripts.stats().items()])
+
+sessions = SessionManager(
+    lambda: TeachingGPT(
+        teaching_conversation_utterance_chain=get_instructor_chain(),
+        max_history=int(os.getenv("MAX_HISTORY_TURNS", 200)),
+        context_turns=int(os.getenv("CONTEXT_TURNS", 0)) or None,
+        context_tokens=int(os.getenv("CONTEXT_TOKENS", 0)) or None,
+        syllabus_retrieval=os.getenv("SYLLABUS_RETRIEVAL", "off").lower() in ("1", "on", "true"),
+        prefetch=os.getenv("INSTRUCTOR_PREFETCH", "off").lower() in ("1", "on", "true"),
+    ),
+    max_sessions=int(os.getenv("MAX_SESSIONS", 500)),
+    idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", 1800)),
+    spill_dir=os.getenv("SESSION_SPILL_DIR") or None,
+    transcripts=transcripts,
 )
 
-
-# ✅ Teaching Agent
-teaching_agent = TeachingGPT.from_llm(llm=llm, verbose=False)
-
 # ✅ Helpers
 translator = MultilingualSupport()
 tracker = ProgressTracker()
 
+# ✅ Time budgets (seconds) for the independent study-material generators
+MATERIAL_TIMEOUTS = {
+    "syllabus": float(os.getenv("SYLLABUS_TIMEOUT", 180)),
+    "assignment": float(os.getenv("ASSIGNMENT_TIMEOUT", 60)),
+    "quiz": float(os.getenv("QUIZ_TIMEOUT", 60)),
+}
+
+# ✅ Time budgets (seconds) per user action: overrun, superseded or abandoned work stops at its next LLM call
+ACTION_BUDGETS = {
+    "generate_material": float(os.getenv("MATERIAL_BUDGET", max(MATERIAL_TIMEOUTS.values()))),
+    "assignment": MATERIAL_TIMEOUTS["assignment"],
+    "quiz": MATERIAL_TIMEOUTS["quiz"],
+    "translate": float(os.getenv("TRANSLATE_TIMEOUT", 60)),
+    "flashcards": float(os.getenv("FLASHCARDS_TIMEOUT", 120)),
+    "chat": float(os.getenv("CHAT_TIMEOUT", 120)),
+}
+
+# ✅ Admission control: per-action concurrency limits, chat admitted ahead of bulk generation,
+# and a bounded wait queue that answers "try later" instead of piling up requests
+admission = default_controller()
+
+
+def busy(*args, **kwargs):
+    return BUSY_MESSAGE
+
+# ✅ Identical concurrent requests (e.g. a whole class entering the same topic) share one generation
+flight = SingleFlight()
+metrics.registry.register_collector(flight.metrics)
+coalesced_generators = {
+    "syllabus": flight.wrap("syllabus", generate_syllabus, timeout=MATERIAL_TIMEOUTS["syllabus"]),
+    "assignment": flight.wrap("assignment", generate_assignment, timeout=MATERIAL_TIMEOUTS["assignment"]),
+    "quiz": flight.wrap("quiz", generate_quiz, timeout=MATERIAL_TIMEOUTS["quiz"]),
+}
+
+# ✅ Precomputed material: answered from the content store first; popular topics are kept warm in the background
+content_store = default_store()
+warmup = None
+if content_store is not None:
+    metrics.registry.register_collector(lambda: [(f"content_store_{k}", v, {}) for k, v in content_store.stats().items()])
+    warmup = WarmupWorker(
+        content_store,
+        {
+            "syllabus": lambda topic: coalesced_generators["syllabus"](topic, f"Generate a course syllabus to teach the topic: {topic}"),
+            "assignment": coalesced_generators["assignment"],
+            "quiz": coalesced_generators["quiz"],
+        },
+        top_k=int(os.getenv("WARMUP_TOP_K", 10)),
+        interval=float(os.getenv("WARMUP_INTERVAL", 3600)),
+        topic_counts=lambda: tracker.backend.topic_counts(COMPLETED),
+    )
+
+
+def from_store(topic, kind):
+    """Stored material for the topic, or None. A stale copy is still returned and queued for regeneration."""
+    if content_store is None:
+        return None
+    entry = content_store.get(topic, kind)
+    if entry is None:
+        metrics.registry.inc("content_store_lookups_total", kind=kind, result="miss")
+        return None
+    metrics.registry.inc("content_store_lookups_total", kind=kind, result="stale" if entry.stale else "hit")
+    if entry.stale:
+        warmup.enqueue(topic)
+    return entry.value
+
+
+def stored(kind, generator):
+    """generator(topic, ...) served from the content store when possible; new results are saved."""
+    @functools.wraps(generator)
+    def serve(topic, *args):
+        value = from_store(topic, kind)
+        if value is None:
+            value = generator(topic, *args)
+            if content_store is not None:
+                content_store.put(topic, kind, value)
+        return value
+    return serve
+
+
+def syllabus_stream(topic, task):
+    """Syllabus textbox updates: the stored copy at once, otherwise the live dialogue's progress (coalesced)."""
+    syllabus = from_store(topic, "syllabus")
+    if syllabus is not None:
+        yield syllabus
+        return
+    for syllabus in flight.stream(make_key("syllabus", topic, task), lambda: generate_syllabus_stream(topic, task),
+                                  timeout=MATERIAL_TIMEOUTS["syllabus"], name="syllabus"):
+        yield syllabus
+    if content_store is not None and syllabus:
+        content_store.put(topic, "syllabus", syllabus)
+
+
+assignment_generator = stored("assignment", coalesced_generators["assignment"])
+quiz_generator = stored("quiz", coalesced_generators["quiz"])
+
 with gr.Blocks() as demo:
     gr.Markdown("# 🎓 Your AI Instructor (EduGPT)")
 
@@ -56,17 +172,44 @@ with gr.Blocks() as demo:
         assignment_btn = gr.Button("🛠 Generate Assignment")
         quiz_btn = gr.Button("❓ Generate Quiz")
 
-        def generate_all_material(topic):
+        @metrics.instrument_action("generate_material")
+        @request_context.bounded("generate_material", ACTION_BUDGETS["generate_material"])
+        @admission.guard("generate_material", busy=lambda *args: (BUSY_MESSAGE, "", ""))
+        def generate_all_material(topic, request: gr.Request):
             task = f"Generate a course syllabus to teach the topic: {topic}"
-            syllabus = generate_syllabus(topic, task)
-            assignment = generate_assignment(topic)
-            quiz = generate_quiz(topic)
-            teaching_agent.seed_agent(syllabus, task)
-            return syllabus, assignment, quiz
+            if content_store is not None:
+                content_store.log_request(topic)
+            results = {"syllabus": "", "assignment": "", "quiz": ""}
+            tasks = {
+                "syllabus": lambda: syllabus_stream(topic, task),
+                "assignment": lambda: assignment_generator(topic),
+                "quiz": lambda: quiz_generator(topic),
+            }
+            # Assignment and quiz only need the topic, so all three run at once: the syllabus box
+            # follows the dialogue as it progresses and the others fill in when they finish.
+            # If the request is cancelled, the dialogue stops before its next LLM call.
+            for name, value, error, done in stream_concurrently(tasks, timeouts=MATERIAL_TIMEOUTS):
+                if isinstance(error, request_context.Cancelled) and not isinstance(error, request_context.DeadlineExceeded):
+                    return  # superseded or abandoned: nothing more to show, and the agent is not seeded
+                if error is not None:
+                    results[name] = f"⚠️ {name.capitalize()} generation failed: {error}"
+                else:
+                    results[name] = value
+                    if done and name == "syllabus":
+                        sessions.get(request.session_hash).seed_agent(value, task)
+                yield results["syllabus"], results["assignment"], results["quiz"]
 
         generate_btn.click(generate_all_material, inputs=topic_input, outputs=[syllabus_output, assignment_output, quiz_output])
-        assignment_btn.click(generate_assignment, inputs=topic_input, outputs=assignment_output)
-        quiz_btn.click(generate_quiz, inputs=topic_input, outputs=quiz_output)
+        assignment_btn.click(
+            metrics.instrument_action("assignment")(
+                request_context.bounded("assignment", ACTION_BUDGETS["assignment"])(admission.guard("assignment", busy)(assignment_generator))
+            ),
+            inputs=topic_input, outputs=assignment_output,
+        )
+        quiz_btn.click(
+            metrics.instrument_action("quiz")(request_context.bounded("quiz", ACTION_BUDGETS["quiz"])(admission.guard("quiz", busy)(quiz_generator))),
+            inputs=topic_input, outputs=quiz_output,
+        )
 
     # =================== Tab 2: Multilingual Translator ===================
     with gr.Tab("🌐 Translate Output"):
@@ -75,18 +218,27 @@ with gr.Blocks() as demo:
         translated_output = gr.Textbox(label="🗣️ Translated Text")
 
         translate_button = gr.Button("🌍 Translate")
-        translate_button.click(fn=translator.translate_text, inputs=[text_to_translate, lang_choice], outputs=translated_output)
+        translate_button.click(fn=metrics.instrument_action("translate")(request_context.bounded("translate", ACTION_BUDGETS["translate"])(admission.guard("translate", busy)(translator.translate_text))), inputs=[text_to_translate, lang_choice], outputs=translated_output)
 
     # =================== Tab 3: Flashcards ===================
     with gr.Tab("📋 Flashcards"):
         flashcard_output = gr.Textbox(label="🧠 Generated Flashcards")
         flashcard_button = gr.Button("📚 Generate Flashcards from AI Lecture")
 
-        def generate_flashcards_from_ai():
-            content = "\n".join(teaching_agent.conversation_history)
-            if not content.strip():
+        @metrics.instrument_action("flashcards")
+        @request_context.bounded("flashcards", ACTION_BUDGETS["flashcards"])
+        @admission.guard("flashcards", busy)
+        def generate_flashcards_from_ai(request: gr.Request):
+            agent = sessions.get(request.session_hash)
+            if not "\n".join(agent.conversation_history).strip():
                 return "⚠️ No lecture found. Please chat with the AI instructor first!"
-            return generate_flashcards(content)
+            # Each session keeps its own deck; only lecture turns added since the last click are sent.
+            if agent.flashcard_deck is None:
+                agent.flashcard_deck = IncrementalFlashcards()
+            agent.flashcard_deck.update(agent.conversation_history, agent.turn_count)
+            if not agent.flashcard_deck.cards:
+                return "⚠️ Flashcard generation failed. Please try again."
+            return format_flashcards(agent.flashcard_deck.cards)
 
         flashcard_button.click(generate_flashcards_from_ai, outputs=flashcard_output)
 
@@ -96,7 +248,13 @@ with gr.Blocks() as demo:
         progress_output = gr.Textbox(label="📊 Updated Progress")
 
         progress_btn = gr.Button("✅ Mark as Completed")
-        progress_btn.click(fn=tracker.update_progress, inputs=progress_input, outputs=progress_output)
+
+        @metrics.instrument_action("mark_completed")
+        @admission.guard("mark_completed", busy)
+        def mark_completed(topic, request: gr.Request):
+            return tracker.update_progress(topic, user_id=request.username or None)
+
+        progress_btn.click(fn=mark_completed, inputs=progress_input, outputs=progress_output)
 
     # =================== Tab 5: AI Instructor Chat ===================
     with gr.Tab("👨‍🏫 Chat with AI Instructor"):
@@ -105,19 +263,59 @@ with gr.Blocks() as demo:
         clear = gr.Button("🧹 Clear")
 
         def user(user_message, history):
-            teaching_agent.human_step(user_message)
             return "", history + [[user_message, None]]
 
-        def bot(history):
-            bot_message = teaching_agent.instructor_step()
+        def chat_busy(history, request: gr.Request):
+            history[-1][1] = BUSY_MESSAGE
+            return history
+
+        @metrics.instrument_action("chat")
+        @request_context.bounded("chat", ACTION_BUDGETS["chat"])
+        @admission.guard("chat", chat_busy)
+        def bot(history, request: gr.Request):
+            agent = sessions.get(request.session_hash)
+            # Recorded only once admitted: a rejected turn leaves no unanswered message in the lesson.
+            agent.human_step(history[-1][0])
             history[-1][1] = ""
-            for char in bot_message:
-                history[-1][1] += char
-                time.sleep(0.05)
+            try:
+                for token in agent.instructor_stream():
+                    history[-1][1] += token
+                    yield history
+            except request_context.DeadlineExceeded:
+                history[-1][1] += "\n\n⚠️ The instructor ran out of time for this reply. Please ask again."
                 yield history
-
-        msg.submit(user, [msg, chatbot], [msg, chatbot], queue=False).then(bot, chatbot, chatbot)
-        clear.click(lambda: [], None, chatbot, queue=False)
+            except request_context.Cancelled:
+                return  # superseded by a newer message, or the client went away
+
+        chat_event = msg.submit(user, [msg, chatbot], [msg, chatbot], queue=False).then(bot, chatbot, chatbot)
+        # Clearing the chat also stops a reply that is still streaming.
+        clear.click(lambda: [], None, chatbot, queue=False, cancels=[chat_event])
+
+    # =================== Tab 6: Metrics ===================
+    with gr.Tab("📊 Metrics"):
+        latency_output = gr.Textbox(label="⏱ Latency percentiles (seconds)", lines=15)
+        queue_output = gr.Textbox(label="🚦 Request queues", lines=8)
+        trace_output = gr.Textbox(label="🔍 Recent traces", lines=15)
+        metrics_btn = gr.Button("🔄 Refresh")
+        metrics_btn.click(
+            lambda: (metrics.summary_table(), admission.stats_table(), metrics.recent_traces()),
+            outputs=[latency_output, queue_output, trace_output], queue=False,
+        )
 
 # ✅ Start App
-demo.queue().launch(debug=True, share=True)
+if __name__ == "__main__":
+    if os.getenv("METRICS_PORT"):
+        metrics.serve(int(os.getenv("METRICS_PORT")))
+    if os.getenv("METRICS_DUMP_PATH"):
+        metrics.start_file_dump(os.getenv("METRICS_DUMP_PATH"), float(os.getenv("METRICS_DUMP_INTERVAL", 15)))
+    if warmup is not None:
+        warmup.start()  # also refreshes stale entries served by from_store, even with WARMUP_TOP_K=0
+    if transcripts is not None:
+        transcripts.purge(
+            older_than=float(os.getenv("TRANSCRIPT_RETENTION", 30 * 24 * 3600)),
+            max_total_bytes=int(os.getenv("TRANSCRIPT_MAX_BYTES", 0)) or None,
+        )
+    # Gradio runs each event one at a time by default; concurrency is left to the admission controller.
+    demo.queue(default_concurrency_limit=None).launch(
+        debug=True, share=True, max_threads=admission.capacity + admission.max_queue
+    )
@@ -0,0 +1,173 @@
+# session_manager.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from tokens import count_tokens
+
+
+class SessionState:
+    """Compact snapshot of one learner's teaching session (what gets spilled to disk)."""
+
+    __slots__ = ("syllabus", "topic", "history", "summary", "pending", "recent", "cursor", "turns")
+
+    def __init__(self, syllabus: str = "", topic: str = "", history=None, summary: str = "", pending=None, recent=None, cursor: int = 0, turns: int = 0):
+        self.syllabus = syllabus
+        self.topic = topic
+        self.history = list(history or [])
+        self.summary = summary
+        self.pending = list(pending or [])
+        self.recent = list(recent or [])
+        self.cursor = cursor
+        self.turns = turns or len(self.history)
+
+    @classmethod
+    def from_agent(cls, agent) -> "SessionState":
+        return cls(
+            agent.syllabus,
+            agent.conversation_topic,
+            agent.conversation_history,
+            agent.lesson_summary,
+            agent.pending_summary,
+            agent.recent_turns,
+            agent.section_cursor,
+            agent.turn_count,
+        )
+
+    def apply(self, agent):
+        agent.syllabus = self.syllabus
+        agent.conversation_topic = self.topic
+        agent.conversation_history = list(self.history)
+        agent.lesson_summary = self.summary
+        agent.pending_summary = list(self.pending)
+        agent.recent_turns = list(self.recent)
+        agent.recent_tokens = [count_tokens(turn) for turn in self.recent]
+        agent.section_cursor = self.cursor
+        agent.turn_count = self.turns
+        agent.index_syllabus()
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionState":
+        return cls(**{slot: data[slot] for slot in cls.__slots__ if slot in data})
+
+
+class SessionManager:
+    """
+    One TeachingGPT per Gradio session, kept in LRU order.
+
+    :param agent_factory: Builds a fresh agent; agents should share one LLM chain so a
+        session only costs its own syllabus and history
+    :param max_sessions: Live sessions kept in memory; the least recently used is evicted past this
+    :param idle_timeout: Seconds without activity before a session is evicted
+    :param spill_dir: If set, evicted sessions are written here and restored on their next request
+    :param transcripts: TranscriptStore; every turn is appended as it happens, and a session that is
+        not in memory (evicted, or the process restarted) resumes from the tail of its transcript
+    """
+
+    def __init__(
+        self,
+        agent_factory: Callable[[], object],
+        max_sessions: int = 500,
+        idle_timeout: Optional[float] = 1800,
+        spill_dir: Optional[str] = None,
+        transcripts=None,
+    ):
+        self.agent_factory = agent_factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.spill_dir = spill_dir
+        self.transcripts = transcripts
+        self._sessions = OrderedDict()  # session_id -> (agent, last_seen)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.restores = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, session_id: str):
+        """Return the agent for this session, restoring a spilled session or creating a new one."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            agent = entry[0] if entry else self._restore(session_id)
+            self._sessions[session_id] = (agent, time.monotonic())
+            self._evict()
+            return agent
+
+    def drop(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._close(entry[0])
+            path = self._spill_path(session_id)
+            if path and os.path.exists(path):
+                os.remove(path)
+            if self.transcripts is not None:
+                self.transcripts.delete(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        return {"live_sessions": len(self._sessions), "evictions": self.evictions, "restores": self.restores}
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, (agent, last_seen) = next(iter(self._sessions.items()))
+            idle = self.idle_timeout is not None and now - last_seen > self.idle_timeout
+            if len(self._sessions) <= self.max_sessions and not idle:
+                break
+            self._sessions.popitem(last=False)
+            self._spill(session_id, agent)
+            self._close(agent)
+            self.evictions += 1
+
+    @staticmethod
+    def _close(agent):
+        # A prefetch still running for the session is cancelled and counted as wasted.
+        close = getattr(agent, "close", None)
+        if close is not None:
+            close()
+
+    def _spill_path(self, session_id: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.json")
+
+    def _spill(self, session_id: str, agent):
+        path = self._spill_path(session_id)
+        if path is None or self.transcripts is not None:
+            return  # nothing to do: the transcript is already on disk
+        state = SessionState.from_agent(agent)
+        if not state.syllabus and not state.history:
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def _restore(self, session_id: str):
+        agent = self.agent_factory()
+        if self.transcripts is not None:
+            state = self.transcripts.load(session_id, tail=getattr(agent, "max_history", None) or 200)
+            if state is not None:
+                state.apply(agent)
+                self.restores += 1
+            agent.transcript = self.transcripts.session(session_id)
+            return agent
+        path = self._spill_path(session_id)
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                SessionState.from_dict(json.load(f)).apply(agent)
+            os.remove(path)
+            self.restores += 1
+        return agent
@@ -0,0 +1,171 @@
+# single_flight.py
+
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+import request_context
+from study_models import normalize_topic
+
+
+class SingleFlightTimeout(TimeoutError):
+    """A caller gave up waiting for a computation started by another request."""
+
+
+class FlightCancelled(Exception):
+    """The caller running a streamed computation went away before it finished."""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+def make_key(name: str, *args, **kwargs) -> tuple:
+    """(name, args, kwargs) with every string normalized like topics, so "Linear  Regression" == "linear regression"."""
+    def norm(value):
+        return normalize_topic(value) if isinstance(value, str) else value
+
+    return (name, tuple(norm(a) for a in args), tuple(sorted((k, norm(v)) for k, v in kwargs.items())))
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs the function and every
+    caller that arrives while it is in flight waits for, and receives, the same result or exception.
+    Nothing is cached afterwards; the next call for the key runs again.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None, name: str = "call") -> Any:
+        """
+        :param key: Identity of the computation (see make_key)
+        :param timeout: How long a follower waits for the in-flight call (None = until it finishes);
+            the leader always runs to completion so the followers still get the result
+        :return: fn()'s result, shared by every caller that joined the flight
+        """
+        call, leader = self._join(key, name)
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            self._wait(call, timeout, name)
+            if isinstance(call.error, (FlightCancelled, request_context.Cancelled)):
+                return self.do(key, fn, timeout, name)  # the leader's request went away; run it here
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stream(self, key: Hashable, fn: Callable[[], Iterator], timeout: Optional[float] = None,
+               name: str = "call", poll: float = 0.25) -> Iterator:
+        """
+        do() for a generator: the leader's items are yielded to it as they are produced, and
+        followers see the newest item every `poll` seconds; the last item is the result.
+        If the leader is closed before finishing, a waiting follower takes over and runs it again.
+        """
+        while True:
+            call, leader = self._join(key, name)
+            if leader:
+                break
+            shown = None
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not call.done.wait(poll):
+                request_context.check()
+                if call.result is not None and call.result is not shown:
+                    shown = call.result
+                    yield shown
+                if deadline is not None and time.monotonic() > deadline:
+                    raise SingleFlightTimeout(f"'{name}' still running after {timeout:g}s")
+            if isinstance(call.error, (FlightCancelled, request_context.Cancelled)):
+                continue
+            if call.error is not None:
+                raise call.error
+            if call.result is not shown:
+                yield call.result
+            return
+
+        finished = False
+        try:
+            for item in fn():
+                call.result = item
+                yield item
+            finished = True
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if not finished and call.error is None:
+                call.error = FlightCancelled(name)
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @staticmethod
+    def _wait(call: _Call, timeout: Optional[float], name: str, poll: float = 0.25):
+        """Wait for the leader, giving up on timeout or when the follower's own request is cancelled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not call.done.wait(poll):
+            request_context.check()
+            if deadline is not None and time.monotonic() > deadline:
+                raise SingleFlightTimeout(f"'{name}' still running after {timeout:g}s")
+
+    def _join(self, key: Hashable, name: str):
+        """:return: (call, True) for a new leader, or the in-flight (call, False)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executions[name] = self.executions.get(name, 0) + 1
+                return call, True
+            call.waiters += 1
+            self.coalesced[name] = self.coalesced.get(name, 0) + 1
+            return call, False
+
+    def wrap(self, name: str, fn: Callable, timeout: Optional[float] = None) -> Callable:
+        """fn with identical concurrent calls (same normalized arguments) coalesced."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.do(make_key(name, *args, **kwargs), lambda: fn(*args, **kwargs), timeout=timeout, name=name)
+        return wrapper
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        with self._lock:
+            executions = sum(self.executions.values())
+            saved = sum(self.coalesced.values())
+            return {
+                "executions": executions,
+                "calls_saved": saved,
+                "saved_ratio": saved / (executions + saved) if executions + saved else 0.0,
+                "saved_per_function": dict(self.coalesced),
+                "in_flight": len(self._calls),
+            }
+
+    def metrics(self):
+        """Collector for metrics.registry."""
+        with self._lock:
+            gauges = [("single_flight_executions_total", n, {"function": f}) for f, n in self.executions.items()]
+            gauges += [("single_flight_calls_saved_total", n, {"function": f}) for f, n in self.coalesced.items()]
+            gauges.append(("single_flight_in_flight", len(self._calls), {}))
+        return gauges
@@ -0,0 +1,229 @@
+# study_models.py
+
+import gzip
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+
+@dataclass(slots=True)
+class Flashcard:
+    question: str
+    answer: str
+
+    def to_compact(self) -> list:
+        return [self.question, self.answer]
+
+    @classmethod
+    def from_compact(cls, data) -> "Flashcard":
+        return cls(data[0], data[1])
+
+
+@dataclass(slots=True)
+class MCQ:
+    question: str
+    options: Tuple[str, ...]
+    correct: Optional[int] = None  # index into options, None if the quiz did not mark one
+
+    def to_compact(self) -> list:
+        return [self.question, list(self.options), self.correct]
+
+    @classmethod
+    def from_compact(cls, data) -> "MCQ":
+        return cls(data[0], tuple(data[1]), data[2])
+
+
+@dataclass(slots=True)
+class OpenQuestion:
+    question: str
+    expected: str = ""  # model answer or guidance, when the quiz includes one
+
+    def to_compact(self) -> list:
+        return [self.question, self.expected]
+
+    @classmethod
+    def from_compact(cls, data) -> "OpenQuestion":
+        return cls(data[0], data[1])
+
+
+@dataclass(slots=True)
+class Quiz:
+    topic: str = ""
+    mcqs: List[MCQ] = field(default_factory=list)
+    short_answers: List[OpenQuestion] = field(default_factory=list)
+    long_answers: List[OpenQuestion] = field(default_factory=list)
+
+    def to_compact(self) -> dict:
+        return {
+            "t": self.topic,
+            "m": [q.to_compact() for q in self.mcqs],
+            "s": [q.to_compact() for q in self.short_answers],
+            "l": [q.to_compact() for q in self.long_answers],
+        }
+
+    @classmethod
+    def from_compact(cls, data: dict) -> "Quiz":
+        return cls(
+            data.get("t", ""),
+            [MCQ.from_compact(q) for q in data.get("m", [])],
+            [OpenQuestion.from_compact(q) for q in data.get("s", [])],
+            [OpenQuestion.from_compact(q) for q in data.get("l", [])],
+        )
+
+
+def normalize_topic(topic: str) -> str:
+    """Key used to dedupe topics (batch runs, request coalescing, content store): case-folded, whitespace collapsed."""
+    return re.sub(r"\s+", " ", topic).strip().casefold()
+
+
+# ✅ Tolerant parsers for the free-form LLM output
+
+_MARKUP = re.compile(r"[*_`#]+")
+_CARD_Q = re.compile(r"^(?:\d+[.)]\s*)?(?:q|question)\s*\d*\s*[:.)-]\s*(.*)$", re.IGNORECASE)
+_CARD_A = re.compile(r"^(?:a|answer)\s*\d*\s*[:.)-]\s*(.*)$", re.IGNORECASE)
+_CARD_HEADER = re.compile(r"^(?:\d+[.)]\s*)?(?:flash\s*)?card\s*#?\s*\d+\s*(?:[:.)-]\s*(.*))?$", re.IGNORECASE)
+_NUMBERED = re.compile(r"^(?:q(?:uestion)?\s*)?\d+\s*[.):-]\s*(.+)$", re.IGNORECASE)
+_OPTION = re.compile(r"^(?:[-•]\s*)?\(?([a-hA-H])[).:]\s*(.+)$")
+_CORRECT_MARK = re.compile(r"\s*[(\[]\s*correct(?: answer)?\s*[)\]]|\s*✅|\s*✔", re.IGNORECASE)
+_ANSWER_LINE = re.compile(r"^(?:correct\s+)?answer\s*[:\-]\s*\(?([a-hA-H])\b", re.IGNORECASE)
+_EXPECTED_LINE = re.compile(r"^(?:model\s+|sample\s+|expected\s+)?(?:answer|response|key points?)\b[^:]*:\s*(.*)$", re.IGNORECASE)
+_SECTIONS = (
+    ("mcq", re.compile(r"multiple[\s-]*choice|\bmcqs?\b", re.IGNORECASE)),
+    ("short", re.compile(r"short[\s-]*answer", re.IGNORECASE)),
+    ("long", re.compile(r"long[\s-]*answer|essay", re.IGNORECASE)),
+)
+
+
+def _clean(line: str) -> str:
+    return _MARKUP.sub("", line).strip()
+
+
+def parse_flashcards(text: str) -> List[Flashcard]:
+    """
+    Parse "Q: ... / A: ..." cards; numbering, markdown, multi-line answers and "Flashcard 2:" headers
+    (which end the previous card and may carry the question) are tolerated.
+    """
+    cards = []
+    question = None
+    answer: List[str] = []
+    for raw in text.splitlines():
+        line = _clean(raw)
+        if not line:
+            continue
+        header = _CARD_HEADER.match(line)
+        if header:
+            if question is not None and answer:
+                cards.append(Flashcard(question, " ".join(answer)))
+            question, answer = None, []
+            line = (header.group(1) or "").strip()
+            if not line:
+                continue
+            if not _CARD_Q.match(line) and not _CARD_A.match(line):
+                question = line
+                continue
+        q = _CARD_Q.match(line)
+        if q:
+            if question is not None and answer:
+                cards.append(Flashcard(question, " ".join(answer)))
+            question, answer = q.group(1).strip(), []
+            continue
+        a = _CARD_A.match(line)
+        if a and question is not None:
+            answer = [a.group(1).strip()]
+        elif question is not None and answer:
+            answer.append(line)
+        elif question is not None:
+            question = f"{question} {line}"
+    if question is not None and answer:
+        cards.append(Flashcard(question, " ".join(answer)))
+    return cards
+
+
+def parse_quiz(text: str, topic: str = "") -> Quiz:
+    """
+    Parse generate_quiz output into a Quiz in a single pass.
+    Section headings pick the question type; MCQ options are "a)"/"A."/"(a)" lines and the
+    correct one is marked "(Correct)" (or given on an "Answer: b" line).
+    """
+    quiz = Quiz(topic=topic)
+    section = None
+    mcq = None  # (question, options, correct) being assembled
+    open_question = None
+
+    def flush_mcq():
+        nonlocal mcq
+        if mcq is not None and mcq[1]:
+            quiz.mcqs.append(MCQ(mcq[0], tuple(mcq[1]), mcq[2]))
+        mcq = None
+
+    def flush_open():
+        nonlocal open_question
+        if open_question is not None:
+            target = quiz.short_answers if section == "short" else quiz.long_answers
+            target.append(OpenQuestion(open_question[0], " ".join(open_question[1])))
+        open_question = None
+
+    for raw in text.splitlines():
+        line = _clean(raw)
+        if not line:
+            continue
+
+        heading = next((name for name, pattern in _SECTIONS if pattern.search(line)), None)
+        if heading and not _OPTION.match(line) and len(line) < 60 and not line.endswith("?"):
+            flush_mcq()
+            flush_open()
+            section = heading
+            continue
+
+        if section == "mcq":
+            option = _OPTION.match(line)
+            answer = _ANSWER_LINE.match(line)
+            if answer and mcq is not None:
+                letter_index = ord(answer.group(1).lower()) - ord("a")
+                if letter_index < len(mcq[1]):
+                    mcq[2] = letter_index
+            elif option and mcq is not None:
+                body = option.group(2)
+                if _CORRECT_MARK.search(body):
+                    mcq[2] = len(mcq[1])
+                    body = _CORRECT_MARK.sub("", body)
+                mcq[1].append(body.strip())
+            else:
+                numbered = _NUMBERED.match(line)
+                if numbered or mcq is None or mcq[1]:
+                    flush_mcq()
+                    mcq = [(numbered.group(1) if numbered else line).strip(), [], None]
+                else:
+                    mcq[0] = f"{mcq[0]} {line}"
+        elif section in ("short", "long"):
+            numbered = _NUMBERED.match(line)
+            expected = _EXPECTED_LINE.match(line)
+            if expected and open_question is not None:
+                open_question[1].append(expected.group(1).strip())
+            elif numbered or open_question is None:
+                flush_open()
+                open_question = [(numbered.group(1) if numbered else line).strip(), []]
+            elif open_question[1]:
+                open_question[1].append(line)
+            else:
+                open_question[0] = f"{open_question[0]} {line}"
+    flush_mcq()
+    flush_open()
+    return quiz
+
+
+# ✅ Compact on-disk format: gzip-compressed JSON lines of to_compact() records
+
+def save_compact(path: str, records: Iterable) -> int:
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record.to_compact(), ensure_ascii=False, separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+
+def load_compact(path: str, cls) -> List:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [cls.from_compact(json.loads(line)) for line in f if line.strip()]
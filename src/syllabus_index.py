@@ -0,0 +1,112 @@
+# syllabus_index.py
+
+import math
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+# A top-level syllabus heading: markdown header, "1." / "1)" numbering, or "Week 3:" style labels.
+_HEADING = re.compile(
+    r"^(#{1,6}\s+\S|\*\*\s*\S|(\d{1,2})[.)]\s+\S|(week|module|unit|topic|lesson|section|part)\s+\d+\b)",
+    re.IGNORECASE,
+)
+_NUMBERING = re.compile(r"^\d{1,2}[.)]\s+")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me of on or please tell that the this to "
+    "we what when where which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class SyllabusSection:
+    __slots__ = ("title", "text", "terms", "length")
+
+    def __init__(self, title: str, text: str):
+        self.title = title
+        self.text = text
+        self.terms = Counter(tokenize(text))
+        self.length = sum(self.terms.values())
+
+
+def split_sections(syllabus: str) -> List[SyllabusSection]:
+    """
+    Split a generated syllabus into its top-level sections.
+    Indented or bulleted lines stay with the heading above them; text before the
+    first heading (usually the course title) is attached to the first section.
+    """
+    blocks: List[List[str]] = []
+    preamble: List[str] = []
+    for line in syllabus.splitlines():
+        if line.strip() and line == line.lstrip() and _HEADING.match(line.strip()):
+            blocks.append([line])
+        elif blocks:
+            blocks[-1].append(line)
+        else:
+            preamble.append(line)
+    if not blocks:
+        return [SyllabusSection(syllabus.strip()[:80], syllabus)] if syllabus.strip() else []
+    blocks[0] = preamble + blocks[0]
+    sections = []
+    for block in blocks:
+        text = "\n".join(block).strip()
+        heading = next(line for line in block if line.strip() and _HEADING.match(line.strip()))
+        title = _NUMBERING.sub("", heading.strip("#* ")).strip("* ")
+        sections.append(SyllabusSection(title, text))
+    return sections
+
+
+class SyllabusIndex:
+    """BM25 index over syllabus sections, used to pick the part of the syllabus a turn needs."""
+
+    def __init__(self, sections: List[SyllabusSection], k1: float = 1.5, b: float = 0.75):
+        self.sections = sections
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(s.length for s in sections) / len(sections) if sections else 0.0
+        doc_freq = Counter(term for s in sections for term in s.terms)
+        n = len(sections)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    @classmethod
+    def from_syllabus(cls, syllabus: str) -> "SyllabusIndex":
+        return cls(split_sections(syllabus))
+
+    def __len__(self):
+        return len(self.sections)
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[int, float]]:
+        """:return: Up to k (section index, BM25 score) pairs with a positive score, best first"""
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        if not terms:
+            return []
+        scores = []
+        for index, section in enumerate(self.sections):
+            norm = self.k1 * (1 - self.b + self.b * section.length / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = section.terms.get(term, 0)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((index, score))
+        scores.sort(key=lambda pair: pair[1], reverse=True)
+        return scores[:k]
+
+    def best_match(self, query: str, min_score: float = 1.0) -> Optional[int]:
+        hits = self.search(query, k=1)
+        return hits[0][0] if hits and hits[0][1] >= min_score else None
+
+    def outline(self) -> str:
+        return "\n".join(f"{i + 1}. {s.title}" for i, s in enumerate(self.sections))
+
+    def context(self, current: int) -> str:
+        """Syllabus text for one turn: the full outline (keeps the order visible) plus the current and next sections."""
+        current = max(0, min(current, len(self.sections) - 1))
+        parts = ["Syllabus outline:\n" + self.outline(), "Current section:\n" + self.sections[current].text]
+        if current + 1 < len(self.sections):
+            parts.append("Next section:\n" + self.sections[current + 1].text)
+        return "\n\n".join(parts)
@@ -1,9 +1,13 @@
 # teaching_agent.py
 
+import concurrent.futures
+import contextvars
 import os
-from typing import Any, Dict, List
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
 
-import langchain_community
 from dotenv import load_dotenv
 
 from langchain_core.prompts import PromptTemplate
@@ -11,8 +15,11 @@ from langchain.chains import LLMChain
 from langchain.chains.base import Chain
 from langchain_core.language_models import BaseLanguageModel
 from pydantic import BaseModel, Field
-from openrouter_llm import ChatOpenRouter
-langchain_community.chat_models.ChatOpenAI,
+import metrics
+import request_context
+from model_router import get_model
+from syllabus_index import SyllabusIndex
+from tokens import count_tokens
 # Load environment variables
 load_dotenv()
 
@@ -49,11 +56,121 @@ class InstructorConversationChain(LLMChain):
         return cls(prompt=prompt, llm=llm, verbose=verbose)
 
 
+# Rolling lesson summary (used when the prompt keeps only the last few turns verbatim)
+LESSON_SUMMARY_PROMPT = """Here is the summary of a lesson so far:
+{summary}
+
+Here are the next lines of the lesson:
+{new_lines}
+
+Update the summary in at most {max_words} words. Keep the syllabus topics already covered, key definitions and formulas, open student questions, and where the lesson currently stands."""
+
+
+# Speculative prefetch: student replies that just ask the instructor to carry on
+CONTINUATION_PATTERN = re.compile(
+    r"^(ok(ay)?|yes|yeah|sure|continue|next( topic| section| one)?|go on|go ahead|carry on|proceed|keep going|more|"
+    r"got it|understood|makes sense|thanks?( you)?)([\s,.!]+(please|thanks?( you)?|go on|continue|next))*[\s.!]*$",
+    re.IGNORECASE,
+)
+PREFETCH_MESSAGE = "Continue"
+PREFETCH_TIMEOUT = float(os.getenv("INSTRUCTOR_PREFETCH_TIMEOUT", 120))
+_prefetch_pool = None
+_prefetch_lock = threading.Lock()
+
+
+def is_continuation(message: str) -> bool:
+    return bool(CONTINUATION_PATTERN.match(message.strip()))
+
+
+def _prefetch_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _prefetch_pool
+    with _prefetch_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=int(os.getenv("INSTRUCTOR_PREFETCH_WORKERS", 4)), thread_name_prefix="instructor-prefetch"
+            )
+        return _prefetch_pool
+
+
+class InstructorPrefetch:
+    """
+    The instructor's reply to a hypothetical "Continue", generated in the background right after
+    a turn is delivered. It is served if the student's next message is a continuation and
+    otherwise discarded: its request is cancelled (a stream stops at the next chunk) and the
+    tokens it spent are counted as wasted.
+    """
+
+    def __init__(self, prompt: str, turn: int):
+        self.prompt = prompt
+        self.turn = turn  # turn_count when the prefetch started
+        self.request = request_context.RequestContext(PREFETCH_TIMEOUT)
+        self.parts: List[str] = []
+        self.sent = False
+        self.future: Optional[concurrent.futures.Future] = None
+        self._discarded = False
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def run(self, llm) -> str:
+        try:
+            with request_context.scope(self.request), metrics.call_site("teaching_agent.prefetch"):
+                kwargs = request_context.call_kwargs()
+                self.sent = True
+                for chunk in llm.stream(self.prompt, **kwargs):
+                    request_context.check()
+                    self.parts.append(chunk.content if hasattr(chunk, "content") else str(chunk))
+            return "".join(self.parts)
+        finally:
+            with self._lock:
+                self._finished = True
+                settle = self._discarded
+            if settle:
+                self._count_waste()
+
+    def discard(self, reason: str = "not a continuation"):
+        self.request.cancel(reason)
+        metrics.registry.inc("instructor_prefetch_total", outcome="miss")
+        with self._lock:
+            self._discarded = True
+            settle = self._finished
+        if settle:
+            self._count_waste()
+
+    def _count_waste(self):
+        if self.sent:
+            metrics.registry.inc("instructor_prefetch_wasted_tokens_total", count_tokens(self.prompt), kind="prompt")
+            metrics.registry.inc("instructor_prefetch_wasted_tokens_total", count_tokens("".join(self.parts)), kind="completion")
+
+
 # Teaching Agent controller
 class TeachingGPT(Chain, BaseModel):
     syllabus: str = ""
     conversation_topic: str = ""
     conversation_history: List[str] = []
+    turn_count: int = 0  # utterances ever added since seed_agent (history itself may be trimmed)
+    max_history: Optional[int] = None  # keep only the last N utterances (None = unbounded)
+    # Context window: when context_turns is set, only the last N utterances (and at most
+    # context_tokens tokens) are sent verbatim; older ones are folded into lesson_summary.
+    context_turns: Optional[int] = None
+    context_tokens: Optional[int] = None
+    summary_batch: int = 4
+    summary_max_words: int = 150
+    lesson_summary: str = ""
+    pending_summary: List[str] = []
+    recent_turns: List[str] = []
+    recent_tokens: List[int] = []
+    # Syllabus retrieval: send only the outline plus the current and next sections each turn
+    syllabus_retrieval: bool = False
+    min_sections_for_retrieval: int = 4
+    syllabus_index: Optional[SyllabusIndex] = Field(default=None, exclude=True)
+    section_cursor: int = 0
+    last_human_input: str = ""
+    flashcard_deck: Optional[Any] = Field(default=None, exclude=True)  # IncrementalFlashcards for this lecture
+    # Prefetch: after each reply, generate the reply to "Continue" in the background (see InstructorPrefetch)
+    prefetch: bool = False
+    pending_prefetch: Optional[InstructorPrefetch] = Field(default=None, exclude=True)
+    # Durable transcript (transcript_store.SessionTranscript): every seed, turn and summary change is appended
+    transcript: Optional[Any] = Field(default=None, exclude=True)
     teaching_conversation_utterance_chain: InstructorConversationChain = Field(...)
 
     class Config:
@@ -68,27 +185,234 @@ class TeachingGPT(Chain, BaseModel):
         return []
 
     def seed_agent(self, syllabus: str, task: str):
+        self._discard_prefetch("new syllabus")
         self.syllabus = syllabus
         self.conversation_topic = task
         self.conversation_history = []
+        self.turn_count = 0
+        self.flashcard_deck = None
+        self.lesson_summary = ""
+        self.pending_summary = []
+        self.recent_turns = []
+        self.recent_tokens = []
+        self.section_cursor = 0
+        self.last_human_input = ""
+        self.index_syllabus()
+        if self.transcript is not None:
+            self.transcript.seed(syllabus, task)
+
+    def index_syllabus(self):
+        """Build the section index for the current syllabus (skipped for short syllabi)."""
+        self.syllabus_index = None
+        if self.syllabus_retrieval and self.syllabus:
+            index = SyllabusIndex.from_syllabus(self.syllabus)
+            if len(index) >= self.min_sections_for_retrieval:
+                self.syllabus_index = index
 
     def human_step(self, human_input: str):
-        self.conversation_history.append(human_input.strip() + " <END_OF_TURN>")
+        self.last_human_input = human_input.strip()
+        if not is_continuation(self.last_human_input):
+            self._discard_prefetch()  # stop paying for a reply that will not be used
+        self._remember(human_input.strip() + " <END_OF_TURN>")
+        self._log_turn()
+
+    def _instructor_replied(self, ai_message: str):
+        self._remember(ai_message)
+        if self.syllabus_index is not None:
+            # The instructor follows the syllabus in order, so its latest reply tells us
+            # which section the lesson has reached.
+            reached = self.syllabus_index.best_match(ai_message)
+            if reached is not None and reached >= self.section_cursor:
+                self.section_cursor = reached
+        self._log_turn()
+
+    def _log_turn(self):
+        if self.transcript is not None:
+            self.transcript.turn(
+                self.conversation_history[-1], self.turn_count, self.section_cursor, len(self.pending_summary), len(self.recent_turns)
+            )
+
+    def _remember(self, utterance: str):
+        self.conversation_history.append(utterance)
+        self.turn_count += 1
+        if self.max_history and len(self.conversation_history) > self.max_history:
+            del self.conversation_history[:-self.max_history]
+        if self.context_turns:
+            self._slide_window(utterance)
+
+    def _slide_window(self, utterance: str):
+        self.recent_turns.append(utterance)
+        self.recent_tokens.append(count_tokens(utterance))
+        while len(self.recent_turns) > 1 and (
+            len(self.recent_turns) > self.context_turns
+            or (self.context_tokens and sum(self.recent_tokens) > self.context_tokens)
+        ):
+            self.pending_summary.append(self.recent_turns.pop(0))
+            self.recent_tokens.pop(0)
+
+    def _fold_summary(self):
+        """
+        Fold the pending utterances into the summary once a batch has built up. Runs at the end of
+        the instructor's turn, after the reply is delivered and inside its time budget; if the
+        summarizer fails or runs out of time, the utterances stay pending (and in the prompt
+        verbatim) until the next turn.
+        """
+        if not self.pending_summary or len(self.pending_summary) < self.summary_batch:
+            return
+        try:
+            self._update_summary()
+        except Exception:
+            metrics.registry.inc("lesson_summary_errors_total")
+            return
+        if self.transcript is not None:
+            # Written even if the text is unchanged: the record also says the pending lines were folded.
+            self.transcript.summary(self.lesson_summary, len(self.pending_summary), len(self.recent_turns))
+
+    def _update_summary(self):
+        """Fold the utterances that left the window into the running summary (one LLM call per batch)."""
+        prompt = LESSON_SUMMARY_PROMPT.format(
+            summary=self.lesson_summary or "(nothing yet)",
+            new_lines="\n".join(self.pending_summary),
+            max_words=self.summary_max_words,
+        )
+        with metrics.call_site("teaching_agent.summary"), metrics.span("lesson_summary"):
+            response = self.teaching_conversation_utterance_chain.llm.invoke(prompt, **request_context.call_kwargs())
+        summary = response.content if hasattr(response, "content") else str(response)
+        # Hard cap so a verbose summarizer cannot make the prompt grow again.
+        self.lesson_summary = " ".join(summary.split()[: self.summary_max_words * 2])
+        self.pending_summary = []
 
     def instructor_step(self) -> str:
         result = self._call({})
         return result['text'] if isinstance(result, dict) else str(result)
 
-    def _call(self, inputs: Dict[str, Any]) -> Dict[str, str]:
-        response = self.teaching_conversation_utterance_chain.invoke({
-            "syllabus": self.syllabus,
+    def instructor_stream(self) -> Iterator[str]:
+        """
+        Stream the instructor's next reply token by token as the model produces it.
+        The full reply is added to the conversation history once the stream completes;
+        a cancelled request stops the stream and leaves the history unchanged.
+        """
+        prefetched = self._take_prefetch()
+        if prefetched is not None:
+            yield prefetched
+            self._instructor_replied(prefetched)
+            print("Instructor:", prefetched.rstrip("<END_OF_TURN>"))
+            self._start_prefetch()
+            self._fold_summary()
+            return
+
+        chain = self.teaching_conversation_utterance_chain
+        prompt = chain.prompt.format(**self._prompt_inputs())
+        parts = []
+        with metrics.call_site("teaching_agent.instructor"):
+            for chunk in chain.llm.stream(prompt, **request_context.call_kwargs()):
+                request_context.check()
+                token = chunk.content if hasattr(chunk, "content") else str(chunk)
+                parts.append(token)
+                yield token
+
+        ai_message = "".join(parts)
+        self._instructor_replied(ai_message)
+        print("Instructor:", ai_message.rstrip("<END_OF_TURN>"))
+        self._start_prefetch()
+        self._fold_summary()
+
+    def _start_prefetch(self):
+        """Start generating the reply to a "Continue" from the student (prefetch mode only)."""
+        if not self.prefetch:
+            return
+        self._discard_prefetch()
+        chain = self.teaching_conversation_utterance_chain
+        prefetch = InstructorPrefetch(chain.prompt.format(**self._prompt_inputs(next_human=PREFETCH_MESSAGE)), self.turn_count)
+        prefetch.future = _prefetch_executor().submit(contextvars.copy_context().run, prefetch.run, chain.llm)
+        self.pending_prefetch = prefetch
+
+    def _discard_prefetch(self, reason: str = "not a continuation"):
+        prefetch, self.pending_prefetch = self.pending_prefetch, None
+        if prefetch is not None:
+            prefetch.discard(reason)
+
+    def close(self):
+        """Stop background work when the session leaves memory (evicted or dropped by SessionManager)."""
+        self._discard_prefetch("session closed")
+
+    def _take_prefetch(self) -> Optional[str]:
+        """
+        The prefetched reply, if the student only asked to continue since it started (waiting for it
+        if it is still running); None when there is nothing usable and the reply must be generated.
+        """
+        prefetch, self.pending_prefetch = self.pending_prefetch, None
+        if prefetch is None:
+            return None
+        if self.turn_count != prefetch.turn + 1 or not is_continuation(self.last_human_input):
+            prefetch.discard()
+            return None
+        start = time.perf_counter()
+        while True:
+            try:
+                request_context.check()
+            except request_context.Cancelled:
+                prefetch.discard("request cancelled")
+                raise
+            try:
+                text = prefetch.future.result(timeout=0.1)
+                break
+            except concurrent.futures.TimeoutError:
+                continue
+            except Exception:
+                metrics.registry.inc("instructor_prefetch_total", outcome="failed")
+                return None
+        metrics.registry.inc("instructor_prefetch_total", outcome="hit")
+        metrics.registry.observe("instructor_prefetch_wait_seconds", time.perf_counter() - start)
+        return text
+
+    def _prompt_inputs(self, next_human: Optional[str] = None) -> Dict[str, str]:
+        """:param next_human: Build the prompt as if the student had also said this (for prefetching)"""
+        return {
+            "syllabus": self._syllabus_context(next_human),
             "topic": self.conversation_topic,
-            "conversation_history": "\n".join(self.conversation_history),
-        })
+            "conversation_history": self._history_context(next_human),
+        }
+
+    def _syllabus_context(self, next_human: Optional[str] = None) -> str:
+        if self.syllabus_index is None:
+            return self.syllabus
+        current = self.section_cursor
+        # A real question (not "continue"/"next") may point at another section.
+        asked = self.syllabus_index.best_match(self.last_human_input if next_human is None else next_human, min_score=2.0)
+        if asked is not None:
+            current = asked
+        return self.syllabus_index.context(current)
 
-        ai_message = response['text'] if isinstance(response, dict) else str(response)
-        self.conversation_history.append(ai_message)
+    def _history_context(self, next_human: Optional[str] = None) -> str:
+        upcoming = [next_human + " <END_OF_TURN>"] if next_human else []
+        if not self.context_turns:
+            return "\n".join(self.conversation_history + upcoming)
+        lines = []
+        if self.lesson_summary:
+            lines.append("Summary of the lesson so far: " + self.lesson_summary)
+        return "\n".join(lines + self.pending_summary + self.recent_turns + upcoming)
+
+    def _call(self, inputs: Dict[str, Any]) -> Dict[str, str]:
+        prefetched = self._take_prefetch()
+        if prefetched is not None:
+            self._instructor_replied(prefetched)
+            print("Instructor:", prefetched.rstrip("<END_OF_TURN>"))
+            self._start_prefetch()
+            self._fold_summary()
+            return {"text": prefetched}
+
+        chain = self.teaching_conversation_utterance_chain
+        prompt = chain.prompt.format(**self._prompt_inputs())
+        # The model is called directly (as in instructor_stream) so the per-call timeout can be passed.
+        with metrics.call_site("teaching_agent.instructor"), metrics.span("instructor_turn", turn=self.turn_count):
+            response = chain.llm.invoke(prompt, **request_context.call_kwargs())
+
+        ai_message = response.content if hasattr(response, "content") else str(response)
+        self._instructor_replied(ai_message)
         print("Instructor:", ai_message.rstrip("<END_OF_TURN>"))
+        self._start_prefetch()
+        self._fold_summary()
         return {"text": ai_message}
 
     @classmethod
@@ -97,15 +421,16 @@ class TeachingGPT(Chain, BaseModel):
         return cls(teaching_conversation_utterance_chain=conversation_chain, **kwargs)
 
 
-# ✅ Initialize OpenRouter LLM for the instructor
-llm = ChatOpenRouter(
+# ✅ Module-level `llm` and `teaching_agent` are built lazily on first access
+_lazy = {}
 
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    model="gpt-3.5-turbo-0613",
-    temperature=0.7
-)
 
-# ✅ Teaching agent instance
-config = dict(conversation_history=[], syllabus="", conversation_topic="")
-teaching_agent = TeachingGPT.from_llm(llm=llm, verbose=False, **config)
+def __getattr__(name: str):
+    if name == "llm":
+        return get_model("lecture", temperature=0.7)
+    if name == "teaching_agent":
+        if "teaching_agent" not in _lazy:
+            config = dict(conversation_history=[], syllabus="", conversation_topic="")
+            _lazy["teaching_agent"] = TeachingGPT.from_llm(llm=get_model("lecture", temperature=0.7), verbose=False, **config)
+        return _lazy["teaching_agent"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,57 @@
+# tokens.py
+
+import threading
+from typing import Dict, Iterable
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency (pulled in by langchain-openai)
+    tiktoken = None
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # The encoding file is downloaded on first use; offline we fall back to the estimate.
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count prompt tokens for a piece of text.
+    Uses tiktoken when available, otherwise the usual ~4 characters per token estimate.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(messages: Iterable) -> int:
+    """Token count of a chat message list (content only, per-message overhead ignored)."""
+    return sum(count_tokens(str(getattr(m, "content", m))) for m in messages)
+
+
+# ✅ Process-wide token usage, fed by every chat model call (real or fake)
+_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_usage_lock = threading.Lock()
+
+
+def record_usage(prompt_tokens: int, completion_tokens: int):
+    with _usage_lock:
+        _usage["calls"] += 1
+        _usage["prompt_tokens"] += prompt_tokens or 0
+        _usage["completion_tokens"] += completion_tokens or 0
+
+
+def usage_snapshot() -> Dict[str, int]:
+    with _usage_lock:
+        return dict(_usage)
@@ -0,0 +1,319 @@
+# transcript_store.py
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from session_manager import SessionState
+
+# Record kinds
+SEED = 1  # syllabus and topic; starts a new lecture
+TURN = 2  # one utterance plus the agent's window counters after it
+SUMMARY = 3  # the rolling lesson summary, written whenever it changes
+
+_HEADER = struct.Struct("<IBI")  # record header in the log: payload length, kind, turn number
+_ENTRY = struct.Struct("<QIBI")  # index entry: record offset, payload length, kind, turn number
+_READ_BLOCK = 256  # index entries read per step when walking backwards
+
+
+class TranscriptStore:
+    """
+    Durable lecture transcripts: per session, an append-only log of zlib-compressed JSON records
+    (<sha1>.log) and a fixed-width index of their offsets (<sha1>.idx).
+
+    Resuming walks the index backwards from the end and reads only the records it needs: the
+    latest seed, the latest summary and the last `tail` turns. Seeding a new syllabus starts a
+    fresh log; a log past `max_session_bytes` is rewritten to the seed, the summary and the last
+    `keep_turns` turns; purge() drops idle sessions and keeps the directory under a byte budget.
+    """
+
+    def __init__(self, directory: str = "transcripts", max_session_bytes: int = 1_000_000, keep_turns: int = 200):
+        self.directory = directory
+        self.max_session_bytes = max_session_bytes
+        self.keep_turns = keep_turns
+        self.compactions = 0
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, session_id: str) -> Tuple[str, str]:
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, digest)
+        return base + ".log", base + ".idx"
+
+    def _lock(self, session_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    # ✅ Writing
+
+    def append(self, session_id: str, kind: int, record: dict, turn: int = 0):
+        payload = zlib.compress(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        log_path, idx_path = self._paths(session_id)
+        with self._lock(session_id):
+            with open(log_path, "ab") as log:
+                offset = log.tell()
+                log.write(_HEADER.pack(len(payload), kind, turn) + payload)
+            with open(idx_path, "ab") as idx:
+                idx.write(_ENTRY.pack(offset, len(payload), kind, turn))
+            if offset + _HEADER.size + len(payload) > self.max_session_bytes:
+                self._compact(session_id)
+        metrics.registry.inc("transcript_records_total", kind=str(kind))
+
+    def seed(self, session_id: str, syllabus: str, topic: str):
+        """Start a new lecture: earlier records are no longer needed, so the log starts over."""
+        self.delete(session_id)
+        self.append(session_id, SEED, {"syllabus": syllabus, "topic": topic})
+
+    def turn(self, session_id: str, utterance: str, turns: int, cursor: int = 0, pending: int = 0, recent: int = 0):
+        """
+        :param turns: The agent's turn_count after this utterance
+        :param pending, recent: How many of the latest utterances are in the agent's pending_summary and
+            recent_turns (context window mode), so resume can rebuild the window from the tail
+        """
+        self.append(session_id, TURN, {"u": utterance, "c": cursor, "p": pending, "r": recent}, turn=turns)
+
+    def summary(self, session_id: str, text: str, pending: int = 0, recent: int = 0):
+        """
+        :param pending, recent: The agent's window counters after the fold; they replace those of the
+            turn before this record, whose pending utterances are now in the summary
+        """
+        self.append(session_id, SUMMARY, {"s": text, "p": pending, "r": recent})
+
+    def session(self, session_id: str) -> "SessionTranscript":
+        return SessionTranscript(self, session_id)
+
+    # ✅ Reading
+
+    def _entries_backwards(self, session_id: str) -> Iterator[Tuple[int, int, int, int]]:
+        """Index entries (offset, length, kind, turn), newest first, read a block at a time."""
+        _, idx_path = self._paths(session_id)
+        with open(idx_path, "rb") as idx:
+            end = os.fstat(idx.fileno()).st_size // _ENTRY.size
+            while end > 0:
+                start = max(0, end - _READ_BLOCK)
+                idx.seek(start * _ENTRY.size)
+                block = idx.read((end - start) * _ENTRY.size)
+                for i in range(end - start - 1, -1, -1):
+                    yield _ENTRY.unpack_from(block, i * _ENTRY.size)
+                end = start
+
+    @staticmethod
+    def _index_matches(log_path: str, idx_path: str) -> bool:
+        """The index is current when its last entry ends exactly where the log ends."""
+        if not os.path.exists(idx_path):
+            return False
+        size = os.path.getsize(idx_path)
+        if size % _ENTRY.size:
+            return False
+        if size == 0:
+            return os.path.getsize(log_path) == 0
+        with open(idx_path, "rb") as idx:
+            idx.seek(size - _ENTRY.size)
+            offset, length, _, _ = _ENTRY.unpack(idx.read(_ENTRY.size))
+        return offset + _HEADER.size + length == os.path.getsize(log_path)
+
+    @staticmethod
+    def _rebuild_index(log_path: str, idx_path: str):
+        """Recover after a crash between the log and index writes (or mid-compaction): rescan the log headers."""
+        entries = []
+        with open(log_path, "r+b") as log:
+            size = os.fstat(log.fileno()).st_size
+            offset = 0
+            while offset + _HEADER.size <= size:
+                log.seek(offset)
+                length, kind, turn = _HEADER.unpack(log.read(_HEADER.size))
+                if offset + _HEADER.size + length > size:
+                    break  # torn final record
+                entries.append(_ENTRY.pack(offset, length, kind, turn))
+                offset += _HEADER.size + length
+            log.truncate(offset)
+        tmp_path = idx_path + ".tmp"
+        with open(tmp_path, "wb") as idx:
+            idx.write(b"".join(entries))
+        os.replace(tmp_path, idx_path)
+
+    @staticmethod
+    def _read(log, offset: int, length: int) -> dict:
+        log.seek(offset + _HEADER.size)
+        return json.loads(zlib.decompress(log.read(length)).decode("utf-8"))
+
+    def _tail(self, session_id: str, tail: int):
+        """:return: (seed entry, summary entry, turn entries oldest first) for the current lecture"""
+        seed = summary = None
+        turns = []
+        wanted = tail
+        log_path, idx_path = self._paths(session_id)
+        if not os.path.exists(log_path):
+            return seed, summary, turns
+        if not self._index_matches(log_path, idx_path):
+            self._rebuild_index(log_path, idx_path)
+        with open(log_path, "rb") as log:
+            for entry in self._entries_backwards(session_id):
+                kind = entry[2]
+                if kind == TURN and len(turns) < wanted:
+                    if not turns:
+                        # The window counters of the latest turn say how much of the tail resume needs.
+                        last = self._read(log, entry[0], entry[1])
+                        wanted = max(wanted, last.get("p", 0) + last.get("r", 0))
+                    turns.append(entry)
+                elif kind == SUMMARY and summary is None:
+                    summary = entry
+                elif kind == SEED:
+                    seed = entry
+                    break
+        return seed, summary, turns[::-1]
+
+    def load(self, session_id: str, tail: int = 200) -> Optional[SessionState]:
+        """
+        Rebuild a session from the end of its log.
+
+        :param tail: Utterances to restore verbatim (the agent's max_history); more are read if the
+            context window needs them
+        :return: The session state, or None if nothing was recorded
+        """
+        start = time.perf_counter()
+        with self._lock(session_id):
+            seed, summary, turns = self._tail(session_id, tail)
+            if seed is None and not turns:
+                return None
+            log_path, _ = self._paths(session_id)
+            with open(log_path, "rb") as log:
+                seeded = self._read(log, seed[0], seed[1]) if seed else {}
+                summarized = self._read(log, summary[0], summary[1]) if summary else {}
+                records = [self._read(log, offset, length) for offset, length, _, _ in turns]
+        summary_text = summarized.get("s", "")
+        history = [record["u"] for record in records]
+        last = records[-1] if records else {}
+        window = last
+        if summary and turns and summary[0] > turns[-1][0] and "p" in summarized:
+            window = summarized  # folded after the last turn was logged
+        recent = window.get("r", 0)
+        pending = window.get("p", 0)
+        state = SessionState(
+            seeded.get("syllabus", ""),
+            seeded.get("topic", ""),
+            history[-tail:] if tail else history,
+            summary_text,
+            history[len(history) - recent - pending: len(history) - recent],
+            history[len(history) - recent:] if recent else [],
+            last.get("c", 0),
+            turns[-1][3] if turns else 0,
+        )
+        metrics.registry.observe("transcript_resume_seconds", time.perf_counter() - start)
+        return state
+
+    def exists(self, session_id: str) -> bool:
+        return os.path.exists(self._paths(session_id)[0])
+
+    # ✅ Disk usage
+
+    def _compact(self, session_id: str):
+        """Rewrite the log to the seed, the latest summary and the last keep_turns turns. Caller holds the lock."""
+        seed, summary, turns = self._tail(session_id, self.keep_turns)
+        log_path, idx_path = self._paths(session_id)
+        entries = []
+        with open(log_path, "rb") as log, open(log_path + ".tmp", "wb") as out:
+            # Kept in log order: load() checks whether the summary came after the last turn.
+            for offset, length, kind, turn in sorted([e for e in (seed, summary) if e] + turns):
+                log.seek(offset)
+                entries.append(_ENTRY.pack(out.tell(), length, kind, turn))
+                out.write(log.read(_HEADER.size + length))
+        with open(idx_path + ".tmp", "wb") as idx:
+            idx.write(b"".join(entries))
+        # A crash between the two renames leaves a mismatched index, which the next read rebuilds.
+        os.replace(log_path + ".tmp", log_path)
+        os.replace(idx_path + ".tmp", idx_path)
+        self.compactions += 1
+        metrics.registry.inc("transcript_compactions_total")
+
+    def compact(self, session_id: str):
+        with self._lock(session_id):
+            if self.exists(session_id):
+                self._compact(session_id)
+
+    def delete(self, session_id: str):
+        with self._lock(session_id):
+            for path in self._paths(session_id):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _logs(self) -> List[Tuple[float, int, str]]:
+        """(modified time, bytes incl. index, path without extension) per session, oldest first."""
+        logs = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".log"):
+                base = os.path.join(self.directory, name[:-4])
+                try:
+                    stat = os.stat(base + ".log")
+                    size = stat.st_size + (os.path.getsize(base + ".idx") if os.path.exists(base + ".idx") else 0)
+                except FileNotFoundError:
+                    continue
+                logs.append((stat.st_mtime, size, base))
+        return sorted(logs)
+
+    def purge(self, older_than: Optional[float] = None, max_total_bytes: Optional[int] = None) -> int:
+        """
+        Delete transcripts idle for more than `older_than` seconds, then the least recently
+        written ones until the directory holds at most `max_total_bytes`. :return: Sessions removed
+        """
+        logs = self._logs()
+        total = sum(size for _, size, _ in logs)
+        removed = 0
+        for mtime, size, base in logs:
+            expired = older_than is not None and time.time() - mtime > older_than
+            over = max_total_bytes is not None and total > max_total_bytes
+            if not (expired or over):
+                continue
+            for path in (base + ".log", base + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        logs = self._logs()
+        return {"sessions": len(logs), "bytes": sum(size for _, size, _ in logs), "compactions": self.compactions}
+
+
+class SessionTranscript:
+    """A TranscriptStore bound to one session (what TeachingGPT.transcript holds). Write errors never reach the lesson."""
+
+    __slots__ = ("store", "session_id")
+
+    def __init__(self, store: TranscriptStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    def _write(self, method, *args, **kwargs):
+        try:
+            method(self.session_id, *args, **kwargs)
+        except OSError:
+            metrics.registry.inc("transcript_write_errors_total")
+
+    def seed(self, syllabus: str, topic: str):
+        self._write(self.store.seed, syllabus, topic)
+
+    def turn(self, utterance: str, turns: int, cursor: int = 0, pending: int = 0, recent: int = 0):
+        self._write(self.store.turn, utterance, turns, cursor, pending, recent)
+
+    def summary(self, text: str, pending: int = 0, recent: int = 0):
+        self._write(self.store.summary, text, pending, recent)
+
+
+def default_transcript_store() -> Optional[TranscriptStore]:
+    """Store configured from TRANSCRIPT_STORE (on/off), TRANSCRIPT_DIR, TRANSCRIPT_MAX_SESSION_BYTES and TRANSCRIPT_KEEP_TURNS."""
+    if os.getenv("TRANSCRIPT_STORE", "on").lower() in ("off", "0", "false", "none"):
+        return None
+    return TranscriptStore(
+        os.getenv("TRANSCRIPT_DIR", "transcripts"),
+        max_session_bytes=int(os.getenv("TRANSCRIPT_MAX_SESSION_BYTES", 1_000_000)),
+        keep_turns=int(os.getenv("TRANSCRIPT_KEEP_TURNS", 200)),
+    )
@@ -0,0 +1,193 @@
+# translation_engine.py
+
+import concurrent.futures
+import contextvars
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import request_context
+from llm_cache import MemoryLRU, ResponseCache, SQLiteCache
+from rate_limit import TokenBucket
+
+# Cut points: the whitespace after sentence-ending punctuation, or a line break.
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？؟।])[\"')\]]*\s+|\n+")
+
+
+class GoogleBackend:
+    """
+    deep-translator's GoogleTranslator. Translator instances are reused per language pair;
+    GoogleTranslator keeps request state on the instance, so each thread gets its own.
+    """
+
+    name = "google"
+    max_chars = 4500  # provider limit is 5000 characters per request
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        from deep_translator import GoogleTranslator
+
+        translators = self._local.__dict__.setdefault("translators", {})
+        translator = translators.get((source, target))
+        if translator is None:
+            translator = translators[(source, target)] = GoogleTranslator(source=source, target=target)
+        return translator.translate(text)
+
+
+class StubBackend:
+    """Offline backend for tests and benchmarks: tags the text with the target language."""
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0, max_chars: int = 4500):
+        self.latency = latency
+        self.max_chars = max_chars
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return f"[{target}] {text}"
+
+
+def split_chunks(text: str, max_chars: int) -> List[Tuple[str, str]]:
+    """
+    Split text into chunks of at most max_chars, cutting at sentence boundaries where possible.
+
+    :return: List of (chunk, trailing whitespace) pairs; joining chunk + whitespace gives back the text
+    """
+    chunks = []
+    cuts = [m.end() for m in _SENTENCE_END.finditer(text)]
+    start = 0
+    while start < len(text):
+        limit = start + max_chars
+        if limit >= len(text):
+            end = len(text)
+        else:
+            candidates = [c for c in cuts if start < c <= limit]
+            if candidates:
+                end = candidates[-1]
+            else:
+                space = text.rfind(" ", start, limit)
+                end = space + 1 if space > start else limit
+        piece = text[start:end]
+        body = piece.rstrip()
+        chunks.append((body, piece[len(body):]))
+        start = end
+    return chunks
+
+
+class TranslationEngine:
+    """
+    Translates texts into one or more languages.
+
+    Every (text, language) pair is split into sentence-aligned chunks within the backend's
+    size limit. Identical chunks are translated once, memoized chunks come from the cache,
+    and the rest run concurrently on a shared pool, throttled by a token-bucket rate limiter.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        cache: Optional[ResponseCache] = None,
+        max_workers: int = 8,
+        rate_limiter: Optional[TokenBucket] = None,
+    ):
+        self.backend = backend or GoogleBackend()
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate")
+
+    def translate(self, text: str, target: str, source: str = "auto") -> str:
+        return self.translate_jobs([(text, target)], source)[0]
+
+    def translate_many(self, texts: Sequence[str], target: str, source: str = "auto") -> List[str]:
+        return self.translate_jobs([(text, target) for text in texts], source)
+
+    def translate_languages(self, text: str, targets: Sequence[str], source: str = "auto") -> Dict[str, str]:
+        return dict(zip(targets, self.translate_jobs([(text, target) for target in targets], source)))
+
+    def translate_jobs(self, jobs: Sequence[Tuple[str, str]], source: str = "auto") -> List[str]:
+        """
+        Translate a batch of (text, target language) jobs.
+        All chunks of all jobs are scheduled together, so languages and chunks run in parallel.
+        """
+        split_jobs = [(split_chunks(text, self.backend.max_chars), target) for text, target in jobs]
+        segments = {(chunk, target) for chunks, target in split_jobs for chunk, _ in chunks if chunk.strip()}
+        translated = self._translate_segments(segments, source)
+
+        results = []
+        for chunks, target in split_jobs:
+            results.append("".join(translated.get((chunk, target), chunk) + space for chunk, space in chunks))
+        return results
+
+    def _segment_key(self, segment: str, source: str, target: str) -> str:
+        payload = "\x1f".join([self.backend.name, source, target, segment])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _translate_segments(self, segments, source: str) -> Dict[Tuple[str, str], str]:
+        translated = {}
+        futures = {}
+        for segment, target in segments:
+            cached = self.cache.get(self._segment_key(segment, source, target)) if self.cache else None
+            if cached is not None:
+                translated[(segment, target)] = cached
+            else:
+                futures[self._pool.submit(contextvars.copy_context().run, self._translate_one, segment, source, target)] = (segment, target)
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                translated[futures[future]] = future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return translated
+
+    def _translate_one(self, segment: str, source: str, target: str) -> str:
+        # An abandoned request stops here instead of spending the backend's quota.
+        request_context.check()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        request_context.check()
+        result = self.backend.translate(segment, source, target)
+        if self.cache is not None and result:
+            self.cache.set(self._segment_key(segment, source, target), result)
+        return result
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def default_engine() -> TranslationEngine:
+    """
+    Process-wide engine shared by every MultilingualSupport, configured from the environment:
+    TRANSLATION_CACHE (sqlite/memory/off), TRANSLATION_CACHE_PATH, TRANSLATION_RATE (requests per
+    second, 0 = no limit) and TRANSLATION_WORKERS.
+    """
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            mode = os.getenv("TRANSLATION_CACHE", "sqlite").lower()
+            cache = None
+            if mode not in ("off", "0", "false", "none"):
+                tiers = [MemoryLRU(max_entries=4096)]
+                if mode != "memory":
+                    tiers.append(SQLiteCache(os.getenv("TRANSLATION_CACHE_PATH", ".translation_cache.sqlite")))
+                cache = ResponseCache(tiers)
+            rate = float(os.getenv("TRANSLATION_RATE", 5))
+            _default_engine = TranslationEngine(
+                cache=cache,
+                max_workers=int(os.getenv("TRANSLATION_WORKERS", 8)),
+                rate_limiter=TokenBucket(rate) if rate > 0 else None,
+            )
+        return _default_engine